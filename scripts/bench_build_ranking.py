@@ -0,0 +1,113 @@
+"""
+Times BuildIndex.rank with the builds of all professions loaded, compared to calling compare for every build.
+
+Runs on a temporary SQLite database with random builds and applicants.
+
+Usage: python scripts/bench_build_ranking.py [builds per profession] [applicants per profession]
+"""
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/bench.db"
+# Registers all models
+import main
+from database import Session, engine, init_db
+from helpers.build_index import build_index
+from models.build import Build
+from models.enums.equipment_slot import EquipmentSlot
+from models.enums.profession import Profession
+from models.enums.rarity import Rarity
+from models.equipment import Equipment
+from models.feedback import FeedbackLevel
+from models.item import Item
+from models.stats import EquipmentStats
+
+STATS = ["Berserker", "Viper", "Harrier", "Diviner", "Assassin"]
+WEAPON_TYPES = ["Sword", "Axe", "Focus", "Greatsword"]
+RUNES = ["Superior Rune of the Scholar", "Superior Rune of the Eagle"]
+SIGILS = ["Superior Sigil of Force", "Superior Sigil of Impact", "Superior Sigil of Bursting"]
+
+
+def make_equipment(rng: random.Random) -> Equipment:
+    """Mostly one stat combination with a few mixed in, some equipment has a single weapon set"""
+    equipment = Equipment()
+    main_stats = rng.choice(STATS)
+    single_set = rng.random() < 0.3
+    for slot in EquipmentSlot:
+        if single_set and slot in (EquipmentSlot.WeaponB1, EquipmentSlot.WeaponB2):
+            continue
+        item = Item()
+        item.item_id = 1
+        item.name = "Item"
+        item.level = 80
+        item.rarity = Rarity.Ascended
+        item.slot = slot
+        item.stats = main_stats if rng.random() < 0.8 else rng.choice(STATS)
+        if slot in EquipmentSlot.get_weapon_slots():
+            item.type = rng.choice(WEAPON_TYPES)
+            item.upgrade_1 = rng.choice(SIGILS)
+        else:
+            item.type = slot.name
+            item.upgrade_1 = rng.choice(RUNES) if slot in EquipmentSlot.get_armor_slots() else None
+        item.upgrade_2 = None
+        equipment.add_item(item)
+    equipment.stats = EquipmentStats()
+    return equipment
+
+
+async def run(builds_per_profession: int, applicants_per_profession: int) -> None:
+    rng = random.Random(3)
+    try:
+        await init_db()
+        async with Session.begin() as session:
+            for profession in Profession:
+                for i in range(builds_per_profession):
+                    build = Build()
+                    build.name = f"{profession.name} {i}"
+                    build.url = f"https://snowcrows.com/builds/{profession.name}/{i}"
+                    build.profession = profession
+                    build.archived = False
+                    build.equipment = make_equipment(rng)
+                    session.add(build)
+
+        start = time.perf_counter()
+        await build_index.refresh()
+        builds = sum(map(len, build_index.builds_by_profession.values()))
+        print(f"{builds} builds, index refreshed in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        # Gear of a build with swapped weapon sets must be ranked first with a successful check
+        build = build_index.builds_by_profession[Profession.Guardian][0]
+        equipment = Equipment()
+        for item in build.equipment.items:
+            equipment.add_item(item)
+        equipment.weapon_a1, equipment.weapon_b1 = build.equipment.weapon_b1, build.equipment.weapon_a1
+        best_build, fbc = (await build_index.rank(equipment, Profession.Guardian))[0]
+        assert best_build is build and fbc.level <= FeedbackLevel.SUCCESS, (best_build.name, fbc.level)
+
+        applicants = [(profession, make_equipment(rng)) for profession in Profession
+                      for _ in range(applicants_per_profession)]
+        start = time.perf_counter()
+        for profession, equipment in applicants:
+            await build_index.rank(equipment, profession)
+        rank_time = (time.perf_counter() - start) / len(applicants)
+
+        start = time.perf_counter()
+        for profession, equipment in applicants:
+            for build in build_index.builds_by_profession[profession]:
+                equipment.compare(build.equipment)
+        compare_time = (time.perf_counter() - start) / len(applicants)
+        print(f"{len(applicants)} applicants: rank {rank_time * 1000:.2f}ms per applicant, "
+              f"compare with every build {compare_time * 1000:.2f}ms")
+    finally:
+        await engine.dispose()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 10, int(sys.argv[2]) if len(sys.argv) > 2 else 30))
@@ -0,0 +1,109 @@
+"""
+Times loading equipment and applications with their build and equipment from a synthetic database.
+
+Runs on a temporary SQLite database. The models are imported from the src directory next to this script,
+or from SRC_DIR, so the same script can time an older checkout:
+    git worktree add /tmp/old <commit>
+    SRC_DIR=/tmp/old/src python scripts/bench_equipment_load.py
+
+Usage: python scripts/bench_equipment_load.py [applications]
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.getenv("SRC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")))
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/bench.db"
+# Registers all models
+import main
+from sqlalchemy import select
+from database import Session, engine, init_db
+from models.application import Application
+from models.build import Build
+from models.enums.application_status import ApplicationStatus
+from models.enums.equipment_slot import EquipmentSlot
+from models.enums.profession import Profession
+from models.enums.rarity import Rarity
+from models import item as item_module
+from models.equipment import Equipment
+from models.item import Item
+from models.stats import EquipmentStats
+
+RUNS = 3
+
+
+def make_equipment(seed: int) -> Equipment:
+    """A full equipment, applicants share most of their items like they do in practice"""
+    equipment = Equipment()
+    for slot in EquipmentSlot:
+        item = Item()
+        item.item_id = seed % 7 + len(slot.value)
+        item.name = f"Item {seed % 5}"
+        item.type = slot.name
+        item.level = 80
+        item.rarity = Rarity.Ascended
+        item.slot = slot
+        item.stats = "Berserker"
+        item.upgrade_1 = "Superior Rune of the Scholar" if seed % 2 else None
+        item.upgrade_2 = None
+        equipment.add_item(item)
+    stats = EquipmentStats()
+    stats.power += seed
+    equipment.stats = stats
+    return equipment
+
+
+async def fill(applications: int) -> None:
+    async with Session.begin() as session:
+        build = Build()
+        build.name = "Build"
+        build.url = "https://snowcrows.com/builds"
+        build.profession = Profession.Guardian
+        build.archived = False
+        build.equipment = make_equipment(0)
+        session.add(build)
+        await session.flush()
+        for i in range(applications):
+            application = Application()
+            application.discord_user_id = i
+            application.status = ApplicationStatus.WAITING_FOR_REVIEW
+            application.account_name = f"Account.{i}"
+            application.character_name = f"Character {i}"
+            application.equipment = make_equipment(i)
+            application.build = build
+            session.add(application)
+
+
+async def time_load(stmt) -> list:
+    # The first run starts without cached item records, older checkouts have no cache
+    cache = getattr(item_module, "item_record_cache", None)
+    if cache is not None:
+        cache.clear()
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        async with Session() as session:
+            (await session.execute(stmt)).unique().scalars().all()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def run(applications: int) -> None:
+    try:
+        await init_db()
+        start = time.perf_counter()
+        await fill(applications)
+        print(f"{applications} applications, saved in {(time.perf_counter() - start) * 1000:.0f}ms")
+        for name, stmt in (("equipment", select(Equipment)), ("applications", select(Application))):
+            timings = await time_load(stmt)
+            print(f"{name:13} first {timings[0] * 1000:6.0f}ms  best of {RUNS} {min(timings) * 1000:6.0f}ms")
+    finally:
+        await engine.dispose()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 3000))
@@ -0,0 +1,120 @@
+"""
+Measures how long the event loop is blocked while logs are decoded.
+
+"before" streams the log on the event loop like get_log_json did before the process pool,
+"after" parses it in the process pool of helpers.dps_report.
+A ticker task sleeps TICK seconds in a loop, the lag is how much later than that it wakes up.
+
+Usage: python scripts/bench_event_loop_lag.py [players] [concurrent logs]
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import ijson
+from helpers import dps_report
+from helpers.dps_report import LogJsonBuilder
+
+TICK = 0.01
+CHUNK_SIZE = 64 * 1024
+
+
+def make_log(players: int) -> dict:
+    """A dps.report-like log with the fields used by the bot and large unused damage and rotation data"""
+    rng = random.Random(1)
+    return {
+        "eiEncounterID": 131329, "fightName": "Vale Guardian", "fightIcon": "", "isCM": False,
+        "gW2Build": 150000, "success": True, "duration": "05m 12s 300ms",
+        "players": [{
+            "account": f"Player.{i:04d}", "name": f"Character {i}", "profession": "Guardian", "healing": 0,
+            "defenses": [{"downCount": 0, "deadCount": 0}],
+            "consumables": [{"id": 91805, "time": 0}],
+            "buffUptimes": [{"id": 740 + b, "buffData": [{"uptime": rng.random() * 100}]} for b in range(40)],
+            "damage1S": [[rng.randint(0, 10 ** 6) for _ in range(600)] for _ in range(10)],
+            "rotation": [{"id": s, "skills": [{"castTime": t, "duration": 500} for t in range(500)]}
+                         for s in range(60)],
+        } for i in range(players)],
+        "mechanics": [{"name": "Split", "fullName": "Split", "mechanicsData": [{"actor": "Character 1"}]}],
+    }
+
+
+def parse_file(path: str) -> dict:
+    """Same work as download_log_json, reading from a file instead of dps.report"""
+    with open(path, "rb") as f:
+        return LogJsonBuilder().build(ijson.basic_parse(f, use_float=True))
+
+
+class FileStream:
+    """Async reader of a file in chunks, like the aiohttp response content"""
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+
+    async def read(self, n: int = -1) -> bytes:
+        # Yield to the loop between chunks like a network read would
+        await asyncio.sleep(0)
+        return self.file.read(n if 0 <= n <= CHUNK_SIZE else CHUNK_SIZE)
+
+
+async def parse_on_loop(path: str) -> dict:
+    """The streaming parse of get_log_json before the process pool"""
+    stream = FileStream(path)
+    builder = LogJsonBuilder()
+    try:
+        async for event, value in ijson.basic_parse_async(stream, use_float=True):
+            if builder.skip_depth:
+                builder.skip(event)
+            else:
+                builder.event(event, value)
+        return builder.result
+    finally:
+        stream.file.close()
+
+
+async def parse_in_pool(path: str) -> dict:
+    return await asyncio.get_running_loop().run_in_executor(dps_report.get_executor(), parse_file, path)
+
+
+async def measure(parse, path: str, concurrent: int) -> tuple:
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - start - TICK)
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(parse(path) for _ in range(concurrent)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    return elapsed, max(lags), statistics.mean(lags), statistics.quantiles(lags, n=100)[98]
+
+
+async def main(players: int, concurrent: int) -> None:
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(make_log(players), f)
+    print(f"log: {os.path.getsize(path) / 1024 / 1024:.1f} MB, {concurrent} concurrent, "
+          f"{os.getenv('LOG_PARSER_WORKERS', 2)} workers")
+    try:
+        # Start the workers before measuring
+        await parse_in_pool(path)
+        for name, parse in (("before (on loop)", parse_on_loop), ("after (process pool)", parse_in_pool)):
+            elapsed, max_lag, mean_lag, p99_lag = await measure(parse, path, concurrent)
+            print(f"{name:22} total {elapsed:6.2f}s  lag max {max_lag * 1000:8.1f}ms  "
+                  f"mean {mean_lag * 1000:7.1f}ms  p99 {p99_lag * 1000:8.1f}ms")
+    finally:
+        dps_report.shutdown_executor()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10, int(sys.argv[2]) if len(sys.argv) > 2 else 4))
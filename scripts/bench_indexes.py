@@ -0,0 +1,127 @@
+"""
+Times the per-user log and application queries on a synthetic table, without and with the indexes of the models.
+
+Runs on a temporary SQLite database unless BENCH_DATABASE_URL is set. That database must be empty,
+the tables are dropped afterwards.
+
+Usage: python scripts/bench_indexes.py [logs] [users]
+"""
+import asyncio
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{tmp_dir}/bench.db")
+from sqlalchemy import case, distinct, func, insert, select
+from database import engine
+from models.application import Application
+from models.base import Base
+from models.build import Build
+from models.enums.application_status import ApplicationStatus
+from models.enums.log_status import LogStatus
+from models.enums.pools import BossLogPool
+from models.enums.role import Role
+from models.equipment import Equipment
+from models.log import Log
+
+QUERIES_PER_SHAPE = 200
+TABLES = [Equipment.__table__, Build.__table__, Log.__table__, Application.__table__]
+
+
+def get_queries(user_id: int, tier: int) -> dict:
+    """The query shapes of check_log, SubmitLogView, LogReview, ApplicationOverview and the startup scan"""
+    not_review_denied = Log.status != LogStatus.REVIEW_DENIED
+    same_boss = not_review_denied & (Log.encounter_id == 1) & (Log.tier == tier) & (Log.role == Role.POWER_DPS)
+    return {
+        "check_log boss pools": select(Log.assigned_pool,
+                                       func.sum(case((not_review_denied & (Log.tier == tier), 1), else_=0)),
+                                       func.max(case((Log.log_url == "https://dps.report/x", 1), else_=0)),
+                                       func.max(case((same_boss, 1), else_=0)))
+            .where(Log.discord_user_id == user_id).where(Log.status != LogStatus.DENIED)
+            .group_by(Log.assigned_pool),
+        "submit active logs": select(func.count(Log.id)).where(Log.discord_user_id == user_id)
+            .where((Log.status == LogStatus.WAITING_FOR_REVIEW) | (Log.status == LogStatus.REVIEW_ACCEPTED)),
+        "review accepted count": select(func.count(Log.id)).where(Log.discord_user_id == user_id)
+            .where(Log.status == LogStatus.REVIEW_ACCEPTED).where(Log.tier == tier).where(Log.role == Role.POWER_DPS),
+        "review t3 bosses": select(func.count(distinct(Log.encounter_id))).where(Log.discord_user_id == user_id)
+            .where((Log.status == LogStatus.REVIEW_ACCEPTED) | (Log.id == 1)).where(Log.tier == 3),
+        "open application": select(Application.id).where(Application.discord_user_id == user_id)
+            .where(Application.status == ApplicationStatus.WAITING_FOR_REVIEW),
+        "pending reviews": select(Log.id).where(Log.status == LogStatus.WAITING_FOR_REVIEW),
+    }
+
+
+def fill(conn, logs: int, users: int) -> None:
+    rng = random.Random(1)
+    now = datetime.datetime.utcnow()
+    # Most logs end up reviewed, only a few are waiting
+    statuses = [LogStatus.DENIED] * 30 + [LogStatus.REVIEW_DENIED] * 10 + [LogStatus.REVIEW_ACCEPTED] * 59 \
+        + [LogStatus.WAITING_FOR_REVIEW]
+    roles = [role for role in Role if role is not Role.NONE]
+    for start in range(0, logs, 10000):
+        conn.execute(insert(Log), [{
+            "discord_user_id": rng.randrange(users), "tier": rng.choice((2, 3)), "role": rng.choice(roles),
+            "log_url": f"https://dps.report/{i}", "encounter_id": rng.randrange(30), "fight_name": "Boss",
+            "is_cm": False, "assigned_pool": rng.choice(list(BossLogPool)), "status": rng.choice(statuses),
+            "submitted_at": now,
+        } for i in range(start, min(start + 10000, logs))])
+    application_statuses = list(ApplicationStatus)
+    conn.execute(insert(Application), [{
+        "discord_user_id": rng.randrange(users), "status": rng.choice(application_statuses), "time_created": now,
+        "account_name": f"Account.{i}", "character_name": f"Character {i}",
+    } for i in range(logs // 5)])
+
+
+def set_indexes(conn, create: bool) -> None:
+    for table in TABLES:
+        for index in table.indexes:
+            if create:
+                index.create(conn, checkfirst=True)
+            else:
+                index.drop(conn, checkfirst=True)
+
+
+async def run(users: int) -> dict:
+    rng = random.Random(2)
+    user_ids = [(rng.randrange(users), rng.choice((2, 3))) for _ in range(QUERIES_PER_SHAPE)]
+    timings = {}
+    async with engine.connect() as conn:
+        for user_id, tier in user_ids:
+            for name, stmt in get_queries(user_id, tier).items():
+                start = time.perf_counter()
+                (await conn.execute(stmt)).all()
+                timings[name] = timings.get(name, 0) + time.perf_counter() - start
+    return {name: total / QUERIES_PER_SHAPE for name, total in timings.items()}
+
+
+async def main(logs: int, users: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+        await conn.run_sync(fill, logs, users)
+    print(f"{engine.dialect.name}: {logs} logs, {logs // 5} applications, {users} users, "
+          f"mean of {QUERIES_PER_SHAPE} queries per shape")
+    try:
+        results = {}
+        for create in (False, True):
+            async with engine.begin() as conn:
+                await conn.run_sync(set_indexes, create)
+                if engine.dialect.name == "sqlite":
+                    await conn.exec_driver_sql("ANALYZE")
+            results[create] = await run(users)
+        print(f"{'query':24} {'without':>10} {'with':>10}")
+        for name in results[False]:
+            print(f"{name:24} {results[False][name] * 1000:8.3f}ms {results[True][name] * 1000:8.3f}ms")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all, tables=TABLES)
+        await engine.dispose()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300000, int(sys.argv[2]) if len(sys.argv) > 2 else 50000))
@@ -1,7 +1,13 @@
-from typing import List
-from sqlalchemy import select
+import asyncio
+import os
+from typing import List, Dict, Any
+import aiohttp
 from database import Session
 from exceptions import APIException
+from helpers.lru_cache import LRUCache
+from helpers.rules import rules
+from helpers.rate_limiter import RateLimiter
+from models.base import insert_ignore
 from models.boss import Boss
 from models.enums.pools import KillProofPool
 from models.feedback import *
@@ -10,21 +16,38 @@ from models.enums.equipment_slot import EquipmentSlot
 from models.enums.rarity import Rarity
 from models.equipment import Equipment
 from models.item import Item
+from models.item_data import ItemData, ItemStatsData
 from models.stats import EquipmentStats
 
 
-class API:
-    def __init__(self, api_key: str = None, version: str = "2021-07-24T00%3A00%3A00Z"):
-        self.api_key = api_key
-        self.version = version
-
-        self.headers = {}
-        if self.api_key:
-            self.headers["Authorization"] = f"Bearer {self.api_key}"
-        if self.version:
-            self.headers["X-Schema-Version"] = self.version
-
-        self.cache = SQLiteBackend(
+class APIClient:
+    """
+    Process-wide HTTP client for the GW2 API. All API instances share its keep-alive connection pool
+    and the handle on the response cache. It is opened and closed together with the bot.
+    """
+    def __init__(self, pool_size: int = 20, keepalive_timeout: int = 60,
+                 requests_per_minute: int = 300, requests_per_minute_per_key: int = 60,
+                 max_retries: int = 4, backoff: float = 1, max_backoff: float = 60, cache_size: int = 10000):
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.session: CachedSession | None = None
+        self.rate_limiter = RateLimiter(requests_per_minute, requests_per_minute_per_key)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Requests that are currently in flight, keyed by url and api key
+        self.in_flight: Dict[tuple, asyncio.Task] = {}
+        # Items and itemstats that are currently being fetched, keyed by endpoint and id.
+        # Bulk requests of different callers overlap, so they are shared per id instead of per url
+        self.in_flight_ids: Dict[tuple, asyncio.Future] = {}
+        # Decoded items and itemstats, in front of the local mirror and the response cache
+        self.item_cache = LRUCache(cache_size)
+        self.item_stats_cache = LRUCache(cache_size)
+
+    async def open(self) -> None:
+        if self.session and not self.session.closed:
+            return
+        cache = SQLiteBackend(
             cache_name="api-cache.db",
             allowed_codes=(200,),
             urls_expire_after={
@@ -33,23 +56,101 @@ class API:
                 "https://api.guildwars2.com/v2/characters?id=*": 60,    # Cache characters for 1 min
                 "https://api.guildwars2.com/": 0,                       # Don't cache anything else
             })
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+        self.session = CachedSession(cache=cache, connector=connector)
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+            await self.session.cache.close()
+            self.session = None
+
+    async def get(self, url: str, headers: dict, api_key: str = None):
+        # Concurrent calls for the same url and key share one request. Public endpoints are requested without a key
+        key = (url, api_key)
+        task = self.in_flight.get(key)
+        if not task:
+            task = asyncio.ensure_future(self.request(url, headers, api_key))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Don't cancel the shared request if one of the callers gets cancelled
+        return await asyncio.shield(task)
+
+    async def request(self, url: str, headers: dict, api_key: str = None):
+        # Open lazily for callers outside the bot lifecycle (e.g. scripts)
+        if not self.session or self.session.closed:
+            await self.open()
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire(api_key)
+            async with self.session.get(url, headers=headers) as resp:
+                if resp.status in (200, 206, 401):
+                    return await resp.json()
+                # Retry if the API is throttling us or has temporary problems
+                if (resp.status == 429 or resp.status >= 500) and attempt < self.max_retries:
+                    delay = self.get_retry_delay(resp.headers.get("Retry-After"), attempt)
+                else:
+                    try:
+                        raise APIException(url, resp.status, await resp.json())
+                    except Exception:
+                        raise APIException(url, resp.status, None)
+            self.rate_limiter.stats.retries += 1
+            await asyncio.sleep(delay)
+
+    def get_retry_delay(self, retry_after: str | None, attempt: int) -> float:
+        # Honor the Retry-After header if it is set, otherwise back off exponentially
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.backoff * 2 ** attempt
+        return min(delay, self.max_backoff)
+
+
+client = APIClient(requests_per_minute=int(os.getenv("GW2_API_RATE_LIMIT", 300)),
+                   requests_per_minute_per_key=int(os.getenv("GW2_API_KEY_RATE_LIMIT", 60)),
+                   cache_size=int(os.getenv("GW2_API_CACHE_SIZE", 10000)))
+
+
+# Endpoints that need an api key. Requests to them are only shared by callers with the same key
+AUTHENTICATED_ENDPOINTS = ("account", "characters", "tokeninfo")
+
+
+class API:
+    def __init__(self, api_key: str = None, version: str = "2021-07-24T00%3A00%3A00Z", max_concurrency: int = 10):
+        self.api_key = api_key
+        self.version = version
+        # Limits how many requests of this instance can be in flight at the same time
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Account data of this key, memoized for the duration of one interaction flow. See invalidate()
+        self.account_context: Dict[str, Any] = {}
+
+        # Public endpoints are requested without the key, so all API instances share their requests
+        self.public_headers = {}
+        if self.version:
+            self.public_headers["X-Schema-Version"] = self.version
+        self.headers = dict(self.public_headers)
+        if self.api_key:
+            self.headers["Authorization"] = f"Bearer {self.api_key}"
 
     async def get_endpoint_v2(self, endpoint: str):
-        url = f"https://api.guildwars2.com/v2/{endpoint}"
-        async with CachedSession(cache=self.cache) as session:
-            resp = await session.get(url, headers=self.headers)
-            if resp.status in (200, 401):
-                return await resp.json()
-            else:
-                try:
-                    raise APIException(url, resp.status, await resp.json())
-                except Exception:
-                    raise APIException(url, resp.status, None)
+        async with self.semaphore:
+            if endpoint.startswith(AUTHENTICATED_ENDPOINTS):
+                return await client.get(f"https://api.guildwars2.com/v2/{endpoint}", self.headers, self.api_key)
+            return await client.get(f"https://api.guildwars2.com/v2/{endpoint}", self.public_headers)
+
+    async def get_account_endpoint(self, endpoint: str):
+        if endpoint not in self.account_context:
+            self.account_context[endpoint] = await self.get_endpoint_v2(endpoint)
+        return self.account_context[endpoint]
+
+    def invalidate(self) -> None:
+        """Drops the memoized account data, e.g. when an interaction flow is finished"""
+        self.account_context.clear()
 
     async def check_key(self) -> FeedbackGroup:
         fbg = FeedbackGroup("API Key")
         # Check if api key is valid
-        tokeninfo = await self.get_endpoint_v2("tokeninfo")
+        tokeninfo = await self.get_account_endpoint("tokeninfo")
         if "Invalid access token" in str(tokeninfo):
             fbg.add(Feedback("Invalid API Key", FeedbackLevel.ERROR))
             return fbg
@@ -72,20 +173,98 @@ class API:
         return fbg
 
     async def get_account_name(self) -> str:
-        account = await self.get_endpoint_v2("account")
+        account = await self.get_account_endpoint("account")
         return account["name"]
 
     async def get_characters(self):
-        return await self.get_endpoint_v2("characters")
+        return await self.get_account_endpoint("characters")
 
     async def get_character_data(self, character_name: str):
-        return await self.get_endpoint_v2(f"characters?id={character_name}")
-
-    async def get_item(self, item_id: int):
-        return await self.get_endpoint_v2(f"items/{item_id}")
-
-    async def get_item_stats(self, item_id: int):
-        return await self.get_endpoint_v2(f"itemstats/{item_id}")
+        return await self.get_account_endpoint(f"characters?id={character_name}")
+
+    async def get_items(self, item_ids) -> Dict[int, dict]:
+        return await self.get_mirrored(ItemData, "items", item_ids, client.item_cache)
+
+    async def get_items_stats(self, stats_ids) -> Dict[int, dict]:
+        return await self.get_mirrored(ItemStatsData, "itemstats", stats_ids, client.item_stats_cache)
+
+    async def get_mirrored(self, model, endpoint: str, ids, cache: LRUCache) -> Dict[int, dict]:
+        # Look up the in-memory cache and the local mirror first and only request missing ids from the API
+        result = {}
+        stored = {}
+        missing = set()
+        for id in {int(id) for id in ids}:
+            data = cache.get(id)
+            if data is not None:
+                result[id] = data
+            else:
+                missing.add(id)
+
+        if missing:
+            async with Session() as session:
+                stored = await model.get_all(session, missing)
+            missing -= stored.keys()
+            result.update(stored)
+
+        if missing:
+            fetched = await self.fetch_mirrored(model, endpoint, missing)
+            stored.update(fetched)
+            result.update(fetched)
+
+        for id, data in stored.items():
+            cache.put(id, data)
+        return result
+
+    async def fetch_mirrored(self, model, endpoint: str, ids) -> Dict[int, dict]:
+        """Requests the ids from the API and stores them. Ids that other callers are already fetching are waited for"""
+        pending = {id: client.in_flight_ids[(endpoint, id)] for id in ids if (endpoint, id) in client.in_flight_ids}
+        futures = {id: asyncio.get_running_loop().create_future() for id in ids if id not in pending}
+        for id, future in futures.items():
+            client.in_flight_ids[(endpoint, id)] = future
+
+        result = {}
+        try:
+            if futures:
+                result = await self.get_bulk(endpoint, futures.keys())
+                async with Session.begin() as session:
+                    # Another request may have stored some of the same ids in the meantime
+                    stmt = insert_ignore(session.bind.dialect.name, model)
+                    await session.execute(stmt, [{"id": id, "data": data} for id, data in result.items()])
+                for id, future in futures.items():
+                    future.set_result(result[id])
+        except BaseException as e:
+            for future in futures.values():
+                if not future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+                        # Only raised for callers that wait for it, don't log it as unhandled otherwise
+                        future.exception()
+            raise
+        finally:
+            for id in futures:
+                client.in_flight_ids.pop((endpoint, id), None)
+
+        for id, future in pending.items():
+            # Don't cancel the shared fetch if this caller gets cancelled
+            result[id] = await asyncio.shield(future)
+        return result
+
+    async def get_bulk(self, endpoint: str, ids, chunk_size: int = 200) -> Dict[int, dict]:
+        # Sort ids so that the same set of ids always results in the same (cacheable) url
+        ids = sorted({int(id) for id in ids})
+        endpoints = [f"{endpoint}?ids={','.join(str(id) for id in ids[i:i + chunk_size])}"
+                     for i in range(0, len(ids), chunk_size)]
+        responses = await asyncio.gather(*[self.get_endpoint_v2(chunk_endpoint) for chunk_endpoint in endpoints])
+        result = {entry["id"]: entry for response in responses for entry in response}
+
+        # The API responds with 206 and leaves out ids that don't exist
+        unknown_ids = [id for id in ids if id not in result]
+        if unknown_ids:
+            raise APIException(f"https://api.guildwars2.com/v2/{endpoint}", 206,
+                               {"text": f"unknown ids: {', '.join(str(id) for id in unknown_ids)}"})
+        return result
 
     async def check_mastery(self) -> FeedbackGroup:
         fbg = FeedbackGroup("Masteries")
@@ -112,35 +291,42 @@ class API:
             fbg.add(Feedback("Shifting Sands is not unlocked", FeedbackLevel.ERROR))
         return fbg
 
+    async def get_account_achievements(self, achievement_ids) -> List[dict]:
+        ids = sorted(set(achievement_ids))
+        if not ids:
+            return []
+        try:
+            return await self.get_endpoint_v2(f"account/achievements?ids={','.join(str(id) for id in ids)}")
+        except APIException as e:
+            # The API responds with 404 if the account has no progress on any of the achievements
+            if e.response_code == 404:
+                return []
+            raise
+
     async def check_kp(self, tier: int) -> FeedbackGroup:
-        # load all relevant bosses from database
-        async with Session.begin() as session:
-            bosses = (await session.execute(select(Boss).where(Boss.kp_pool != KillProofPool.NOT_ALLOWED))).scalars().all()
-
-            # get achievements of player
-            achievements = await self.get_endpoint_v2("account/achievements")
-
-            # check achievements
-            bosses_killed = []
-            for achievement in achievements:
-                for boss in bosses:
-                    # check if achievement is relevant and if it is done
-                    if boss.achievement_id == achievement["id"]:
-                        if achievement["done"]:
-                            bosses_killed.append(boss)
-
-
-
-            match tier:
-                case 1:
-                    return self.__check_kp_t1(bosses_killed, len(bosses))
-                case 2:
-                    return self.__check_kp_t2(bosses_killed, len(bosses))
-                case 3:
-                    bosses_missing = [boss for boss in bosses if boss not in bosses_killed]
-                    return self.__check_kp_t3(bosses_killed, bosses_missing, len(bosses))
-                case _:
-                    raise ValueError("Invalid tier")
+        # load all relevant bosses
+        bosses = await rules.get_kp_bosses()
+        bosses_by_achievement = await rules.get_kp_bosses_by_achievement()
+
+        # only request the achievements of the relevant bosses
+        achievements = await self.get_account_achievements(bosses_by_achievement.keys())
+
+        # check achievements
+        bosses_killed = []
+        for achievement in achievements:
+            if achievement["done"]:
+                bosses_killed.extend(bosses_by_achievement.get(achievement["id"], []))
+
+        match tier:
+            case 1:
+                return self.__check_kp_t1(bosses_killed, len(bosses))
+            case 2:
+                return self.__check_kp_t2(bosses_killed, len(bosses))
+            case 3:
+                bosses_missing = [boss for boss in bosses if boss not in bosses_killed]
+                return self.__check_kp_t3(bosses_killed, bosses_missing, len(bosses))
+            case _:
+                raise ValueError("Invalid tier")
 
     def __check_kp_t1(self, bosses_killed: List[Boss], max_bosses: int, fbg: FeedbackGroup = None) -> FeedbackGroup:
         if not fbg:
@@ -214,19 +400,61 @@ class API:
         if not equipment_tab_items:
             raise Exception("Equipment Tab not found")
 
-        equipment = Equipment()
+        # Skip items like underwater weapons and aqua breather
+        tab_items = [tab_item for tab_item in equipment_tab_items["equipment"] if tab_item["slot"] in EquipmentSlot.__members__]
+
+        # Stats and infusions of some items are only listed in the character's equipment
+        def find_equipment_item(tab_item: dict, key: str):
+            for equipment_item in char_data["equipment"]:
+                if tab_item["id"] == equipment_item["id"] and equipment_tab_items["tab"] in equipment_item["tabs"] and key in equipment_item:
+                    return equipment_item
+            return None
+
+        # Collect all item ids of the tab first to resolve them with bulk requests
+        infusion_ids = {}
+        item_ids = set()
+        for tab_item in tab_items:
+            if "infusions" in tab_item:
+                infusion_ids[tab_item["slot"]] = tab_item["infusions"]
+            else:
+                equipment_item = find_equipment_item(tab_item, "infusions")
+                infusion_ids[tab_item["slot"]] = equipment_item["infusions"] if equipment_item else []
+            item_ids.add(tab_item["id"])
+            item_ids.update(tab_item.get("upgrades", []))
+            item_ids.update(infusion_ids[tab_item["slot"]])
+
+        # Stats listed in the tab are known up front and can be resolved concurrently with the items
+        items_data, stats_data = await asyncio.gather(
+            self.get_items(item_ids),
+            self.get_items_stats(tab_item["stats"]["id"] for tab_item in tab_items if "stats" in tab_item))
+
+        # Determine the stats of every item and resolve the remaining ones in bulk
         stats = EquipmentStats()
-        for equipment_tab_item in equipment_tab_items["equipment"]:
-            # Skip items like underwater weapons and aqua breather
-            try:
-                EquipmentSlot[equipment_tab_item["slot"]]
-            except KeyError:
-                continue
+        stats_ids = {}
+        for tab_item in tab_items:
+            slot = EquipmentSlot[tab_item["slot"]]
+            item_data = items_data[tab_item["id"]]
+            if "stats" in tab_item:
+                stats_ids[tab_item["slot"]] = tab_item["stats"]["id"]
+                stats.add_attributes(slot, stats=tab_item["stats"])
+            elif "infix_upgrade" in item_data["details"]:
+                stats_ids[tab_item["slot"]] = item_data["details"]["infix_upgrade"]["id"]
+                stats.add_attributes(slot, infix_upgrade=item_data["details"]["infix_upgrade"])
+            else:
+                equipment_item = find_equipment_item(tab_item, "stats")
+                if equipment_item:
+                    stats_ids[tab_item["slot"]] = equipment_item["stats"]["id"]
+                    stats.add_attributes(slot, stats=equipment_item["stats"])
+                else:
+                    stats_ids[tab_item["slot"]] = None
+        stats_data.update(await self.get_items_stats(stats_id for stats_id in stats_ids.values() if stats_id and stats_id not in stats_data))
 
+        equipment = Equipment()
+        for tab_item in tab_items:
+            item_data = items_data[tab_item["id"]]
             item = Item()
-            item.item_id = equipment_tab_item["id"]
-            item.slot = EquipmentSlot[equipment_tab_item["slot"]]
-            item_data = await self.get_item(equipment_tab_item['id'])
+            item.item_id = tab_item["id"]
+            item.slot = EquipmentSlot[tab_item["slot"]]
             item.name = item_data["name"]
             item.rarity = Rarity[item_data["rarity"]]
             item.level = item_data["level"]
@@ -234,44 +462,19 @@ class API:
             if "type" in item_data["details"]:
                 item.type = item_data["details"]["type"]
             else:
-                item.type = equipment_tab_item["slot"]
-
-            if "stats" in equipment_tab_item:
-                stats_id = equipment_tab_item["stats"]["id"]
-                stats.add_attributes(item.slot, stats=equipment_tab_item["stats"])
-            elif "infix_upgrade" in item_data["details"]:
-                stats_id = item_data["details"]["infix_upgrade"]["id"]
-                stats.add_attributes(item.slot, infix_upgrade=item_data["details"]["infix_upgrade"])
-            else:
-                for equipment_item in char_data["equipment"]:
-                    if item.item_id == equipment_item["id"] and equipment_tab_items["tab"] in equipment_item["tabs"] and "stats" in equipment_item:
-                        stats_id = equipment_item["stats"]["id"]
-                        stats.add_attributes(item.slot, stats=equipment_item["stats"])
-                        break
-                else:
-                    stats_id = None
+                item.type = tab_item["slot"]
 
+            stats_id = stats_ids[tab_item["slot"]]
             if stats_id:
-                stats_data = await self.get_item_stats(stats_id)
-                item.stats = stats_data["name"]
+                item.stats = stats_data[stats_id]["name"]
             else:
                 item.stats = "none"
 
-            if "upgrades" in equipment_tab_item:
-                for upgrade_data in equipment_tab_item["upgrades"]:
-                    item.add_upgrade((await self.get_item(upgrade_data))["name"])
+            for upgrade_id in tab_item.get("upgrades", []):
+                item.add_upgrade(items_data[upgrade_id]["name"])
 
-            if "infusions" in equipment_tab_item:
-                for infusion in equipment_tab_item["infusions"]:
-                    infusion_data = await self.get_item(infusion)
-                    stats.add_attributes(item.slot, infix_upgrade=infusion_data["details"]["infix_upgrade"])
-            else:
-                for equipment_item in char_data["equipment"]:
-                    if item.item_id == equipment_item["id"] and equipment_tab_items["tab"] in equipment_item["tabs"] and "infusions" in equipment_item:
-                        for infusion in equipment_item["infusions"]:
-                            infusion_data = await self.get_item(infusion)
-                            stats.add_attributes(item.slot, infix_upgrade=infusion_data["details"]["infix_upgrade"])
-                        break
+            for infusion_id in infusion_ids[tab_item["slot"]]:
+                stats.add_attributes(item.slot, infix_upgrade=items_data[infusion_id]["details"]["infix_upgrade"])
 
             equipment.add_item(item)
         equipment.stats = stats
@@ -1,10 +1,15 @@
+import datetime
 import discord
 from discord import app_commands, Interaction, Embed
 from discord.ext import commands
 import typing
 from sqlalchemy import select, func, desc, delete
+from api import API, client
 from database import Session
+from helpers.build_index import build_index
+from helpers.config_cache import config_cache
 from helpers.custom_embed import CustomEmbed
+from helpers.rules import rules
 from models.application import Application
 from models.boss import Boss
 from models.build import Build
@@ -13,6 +18,7 @@ from models.enums.application_status import ApplicationStatus
 from models.enums.config_key import ConfigKey
 from models.enums.pools import KillProofPool, BossLogPool
 from models.enums.profession import Profession
+from models.equipment import Equipment
 from models.feedback import FeedbackLevel
 from snowcrows import get_sc_build, get_sc_builds
 from views.application_overview import ApplicationOverview
@@ -63,7 +69,8 @@ class AdminCommands(commands.Cog):
                         value="1. Press the `Tier 1` button below to start the application process\n"
                               "2. Enter your API key and the name of the character that you want to apply with.\n"
                               "3. The bot will check your Mastery and how many bosses you have killed\n"
-                              "4. Select your equipment template and the build you want to apply for\n"
+                              "4. Select your equipment template and the build you want to apply for. "
+                              "Select `Best matching build` if you are not sure which build you are using\n"
                               "5. The bot will compare your equipment to the build you selected\n"
                               "6. If your gear is correct the bot will automatically grant you the role\n",
                         inline=False)
@@ -133,6 +140,7 @@ class AdminCommands(commands.Cog):
                 return
             build = await get_sc_build(snowcrows_url)
             session.add(build)
+        await build_index.refresh()
         await interaction.followup.send("Build was added", ephemeral=True)
 
     @app_commands.guild_only
@@ -146,11 +154,12 @@ class AdminCommands(commands.Cog):
 
         async with Session.begin() as session:
             build = await Build.find(session, url=snowcrows_url)
-            if build:
-                await build.archive()
-                await interaction.response.send_message("Build was removed", ephemeral=True)
-            else:
+            if not build:
                 await interaction.response.send_message("Build not found", ephemeral=True)
+                return
+            await build.archive()
+        await build_index.refresh()
+        await interaction.response.send_message("Build was removed", ephemeral=True)
 
     @app_commands.guild_only
     @app_commands.default_permissions(administrator=True)
@@ -170,8 +179,7 @@ class AdminCommands(commands.Cog):
                         build = await Build.find(session, name=build_sc.name)
                         # If the build already exists in the DB: check if the gear is the same. if not archive old build
                         if build:
-                            fbc = build.equipment.compare(build_sc.equipment)
-                            if fbc.level <= FeedbackLevel.SUCCESS:
+                            if build.fingerprint == build_sc.equipment.fingerprint:
                                 # Don't need to add it again if the gear is the same
                                 continue
                             else:
@@ -184,9 +192,79 @@ class AdminCommands(commands.Cog):
                 for build in await Build.from_profession(session, profession):
                     if build.name not in new_builds:
                         await build.archive()
+        await build_index.refresh()
 
         await interaction.followup.send(f"Added all recommended and viable builds (hand kite builds were ignored)\n{errors}", ephemeral=True)
 
+    items = app_commands.Group(name="items", description="Manage the local item database")
+
+    @app_commands.guild_only
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @items.command(name="prefetch", description="Store all items of active builds and recent applications and the upgrades of builds locally")
+    async def items_prefetch(self, interaction: Interaction, days: int = 30):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        # Collect the ids of all items used by active builds and recent applications
+        item_ids = set()
+        build_urls = []
+        async with Session() as session:
+            for profession in Profession:
+                for build in await Build.from_profession(session, profession):
+                    item_ids.update(item.item_id for item in build.equipment.items)
+                    if build.url:
+                        build_urls.append(build.url)
+
+            stmt = select(Application).where(Application.time_created >= datetime.datetime.utcnow() - datetime.timedelta(days=days))
+            for application in (await session.execute(stmt)).scalars():
+                if application.equipment:
+                    item_ids.update(item.item_id for item in application.equipment.items)
+
+        # Fetch the items and all stats they can have. Everything that is not stored locally yet gets stored
+        api = API()
+        items_data = await api.get_items(item_ids)
+        stats_ids = set()
+        for item_data in items_data.values():
+            details = item_data.get("details", {})
+            if "infix_upgrade" in details:
+                stats_ids.add(details["infix_upgrade"]["id"])
+            stats_ids.update(details.get("stat_choices", []))
+        stats_data = await api.get_items_stats(stats_ids)
+
+        # Upgrades and infusions are only stored by name. Loading the Snowcrows builds again resolves (and stores) the
+        # ids of the runes, sigils and infusions of the builds, which most applicants use as well
+        errors = ""
+        for url in build_urls:
+            try:
+                await get_sc_build(url, api)
+            except Exception as e:
+                errors += f"Error loading build {url}: {e}\n"
+
+        await interaction.followup.send(f"Prefetched {len(items_data)} items and {len(stats_data)} item stats "
+                                        f"and the upgrades of {len(build_urls)} builds\n{errors}", ephemeral=True)
+
+    @app_commands.guild_only
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @items.command(name="prune", description="Delete stored items that are not used by any build or application")
+    async def items_prune(self, interaction: Interaction):
+        async with Session.begin() as session:
+            deleted = await Equipment.prune_items(session)
+        await interaction.response.send_message(f"Deleted {deleted} unused items", ephemeral=True)
+
+    api = app_commands.Group(name="api", description="Inspect the GW2 API client")
+
+    @app_commands.guild_only
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @api.command(name="stats", description="Show statistics of the GW2 API client")
+    async def api_stats(self, interaction: Interaction):
+        embed = CustomEmbed(self.bot, title="GW2 API Stats")
+        embed.add_field(name="Rate limiter", value=str(client.rate_limiter.stats), inline=False)
+        embed.add_field(name="Item cache", value=str(client.item_cache), inline=True)
+        embed.add_field(name="Item stats cache", value=str(client.item_stats_cache), inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.guild_only
     @app_commands.default_permissions(manage_roles=True)
     @app_commands.checks.has_permissions(manage_roles=True)
@@ -255,6 +333,7 @@ class AdminCommands(commands.Cog):
         async with Session.begin() as session:
             await session.execute(delete(Boss))
             await Boss.init(session)
+        await rules.refresh()
         await interaction.response.send_message("Bosses initialized", ephemeral=True)
 
 
@@ -277,6 +356,7 @@ class AdminCommands(commands.Cog):
 
             boss = Boss(ei_encounter_id=ei_encounter_id, boss_name=boss_name, is_cm=is_cm, kp_pool=kp_pool, log_pool=log_pool, achievement_id=achievement_id)
             session.add(boss)
+        await rules.refresh()
         await interaction.response.send_message("Boss added", ephemeral=True)
 
 
@@ -292,6 +372,7 @@ class AdminCommands(commands.Cog):
                 return
 
             await session.execute(delete(Boss).where(Boss.encounter_id == ei_encounter_id).where(Boss.is_cm == is_cm))
+        await rules.refresh()
         await interaction.response.send_message("Boss deleted", ephemeral=True)
 
 
@@ -321,6 +402,7 @@ class AdminCommands(commands.Cog):
         async with Session.begin() as session:
             await session.execute(delete(Config))
             await Config.init(session, is_prod)
+        await config_cache.refresh()
         await interaction.response.send_message("Config initialized", ephemeral=True)
 
     @app_commands.guild_only
@@ -335,4 +417,5 @@ class AdminCommands(commands.Cog):
                 session.add(config)
             else:
                 config.value = value
+        await config_cache.refresh()
         await interaction.response.send_message("Config updated", ephemeral=True)
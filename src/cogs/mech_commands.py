@@ -1,12 +1,15 @@
 import re
-import aiohttp
 from discord import app_commands, Interaction, Embed
 from discord.ext import commands
 from sqlalchemy import select, delete
 from database import Session
+from exceptions import DpsReportException
 from helpers.custom_embed import CustomEmbed
+from helpers.dps_report import get_log_json
 from helpers.embeds import split_embed
 from helpers.log_checks import check_mechanics
+from helpers.log_digest import LogDigest
+from helpers.rules import rules
 from models.boss import Boss
 from models.enums.mech_mode import MechMode
 from models.feedback import FeedbackGroup
@@ -99,7 +102,9 @@ class MechCommands(commands.Cog):
             session.add(mech)
             await session.flush()
             await session.refresh(mech)
-            await interaction.response.send_message(f"Mechanic check was added:\n{str(mech)}", ephemeral=True)
+            mech_str = str(mech)
+        await rules.refresh()
+        await interaction.response.send_message(f"Mechanic check was added:\n{mech_str}", ephemeral=True)
 
 
     @app_commands.guild_only
@@ -115,6 +120,7 @@ class MechCommands(commands.Cog):
 
             mech_str = str(mech)
             await session.delete(mech)
+        await rules.refresh()
         await interaction.response.send_message(f"Mechanic check was deleted:\n{mech_str}", ephemeral=True)
 
 
@@ -151,7 +157,9 @@ class MechCommands(commands.Cog):
 
             await session.flush()
             await session.refresh(mech)
-            await interaction.response.send_message(f"Mechanic check was edited:\n{str(mech)}", ephemeral=True)
+            mech_str = str(mech)
+        await rules.refresh()
+        await interaction.response.send_message(f"Mechanic check was edited:\n{mech_str}", ephemeral=True)
 
     @app_commands.guild_only
     @app_commands.default_permissions(administrator=True)
@@ -161,6 +169,7 @@ class MechCommands(commands.Cog):
         async with Session.begin() as session:
             await session.execute(delete(Mech))
             Mech.init(session)
+        await rules.refresh()
         await interaction.response.send_message(f"Mechanic checks were initialized.", ephemeral=True)
 
 
@@ -178,37 +187,25 @@ class MechCommands(commands.Cog):
             return
 
         # Get json data from dps.report
-        error = ""
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://dps.report/getJson?permalink=" + log_url) as r:
-                if r.status == 200:
-                    try:
-                        log_json = await r.json()
-                    except Exception as e:
-                        error = f"{log_url}\n{e}"
-                else:
-                    error = f"{log_url}\n{r.status}: {await r.text()}"
-
-        if error:
-            await interaction.followup.send(f"Error while parsing log:\n{error}", ephemeral=True)
+        try:
+            digest = LogDigest(await get_log_json(log_url))
+        except DpsReportException as e:
+            await interaction.followup.send(f"Error while parsing log:\n{e.error_message}", ephemeral=True)
             return
 
         # Check if mech exists for this boss
-        async with Session.begin() as session:
-            stmt = select(Mech).where(Mech.encounter_id == log_json["eiEncounterID"])
-            if not (await session.execute(stmt)).scalars().all():
-                await interaction.followup.send(f"No mechanics are configured for this boss. Use `/mech list` to see all mechanics.", ephemeral=True)
-                return
+        mechs = await rules.get_mechs(digest.encounter_id)
+        if not mechs:
+            await interaction.followup.send(f"No mechanics are configured for this boss. Use `/mech list` to see all mechanics.", ephemeral=True)
+            return
 
-            # Check if the mech exists
-            if mech_id:
-                mech = (await session.execute(stmt.where(Mech.id == mech_id))).scalar()
-                if not mech:
-                    await interaction.followup.send(f"This mechanic does not exist on this boss. Use `/mech list` to see all mechanics.", ephemeral=True)
-                    return
+        # Check if the mech exists
+        if mech_id and not any(mech.id == mech_id for mech in mechs):
+            await interaction.followup.send(f"This mechanic does not exist on this boss. Use `/mech list` to see all mechanics.", ephemeral=True)
+            return
 
 
         fbg = FeedbackGroup(message=f"Checking mechanics")
-        await check_mechanics(log_json, account_name, fbg, mech_id, True)
+        await check_mechanics(digest, account_name, fbg, mech_id, True)
         embed = fbg.to_embed(CustomEmbed(self.bot, title="Mechanic Test"))
         await interaction.followup.send(embed=embed, ephemeral=True)
@@ -5,8 +5,21 @@ from models.base import Base
 
 
 async def init_db():
+    # Imported here because the models depend on this module
+    from models.build import migrate_builds
+    from models.equipment import migrate_equipment
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrate_equipment)
+        await conn.run_sync(migrate_builds)
+        # create_all skips tables that already exist, so add indexes that were introduced later
+        await conn.run_sync(create_missing_indexes)
+
+
+def create_missing_indexes(conn) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 
 engine = create_async_engine(os.getenv("DATABASE_URL"), echo=False)
@@ -9,5 +9,13 @@ class APIException(Exception):
                 response_text = response_json["error"]
         if not response_text:
             response_text = "unknown api error"
+        self.response_code = response_code
         self.error_message = f"{url} {response_code}: {response_text}"
         super().__init__(self.error_message)
+
+
+class DpsReportException(Exception):
+
+    def __init__(self, error_message: str):
+        self.error_message = error_message
+        super().__init__(self.error_message)
@@ -0,0 +1,61 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from helpers.snapshot import Snapshot
+from models.build import Build
+from models.enums.profession import Profession
+from models.equipment import Equipment
+from models.feedback import FeedbackCollection, FeedbackLevel
+
+
+class BuildIndex(Snapshot):
+    """Snapshot of the active builds per profession, used to rank gear against all of them. It is refreshed by the /build commands"""
+    def __init__(self):
+        super().__init__()
+        self.builds_by_profession: Dict[Profession, List[Build]] = {}
+
+    async def load(self, session: AsyncSession) -> None:
+        stmt = select(Build).where(Build.archived == False).order_by(Build.id)
+        builds = (await session.execute(stmt)).scalars().all()
+
+        builds_by_profession = {}
+        for build in builds:
+            builds_by_profession.setdefault(build.profession, []).append(build)
+        self.builds_by_profession = builds_by_profession
+
+    async def get_builds(self, profession: Profession) -> List[Build]:
+        await self.ensure_loaded()
+        return self.builds_by_profession.get(profession, [])
+
+    async def rank(self, equipment: Equipment, profession: Profession) -> List[Tuple[Build, FeedbackCollection]]:
+        """Compares the equipment to all builds of the profession, best match first"""
+        fingerprint = equipment.fingerprint
+        # Only depends on the equipment, so it is shared by all builds with the same fingerprint
+        matching = None
+        results = []
+        for build in await self.get_builds(profession):
+            if build.fingerprint == fingerprint:
+                if matching is None:
+                    matching = equipment.check_matching()
+                if matching.level <= FeedbackLevel.SUCCESS:
+                    results.append((build, matching))
+                    continue
+            results.append((build, equipment.compare(build.equipment)))
+        # Builds with the same result keep the order in which they were added
+        results.sort(key=lambda result: get_score(result[1]))
+        return results
+
+
+def get_score(fbc: FeedbackCollection) -> Tuple[FeedbackLevel, int, int]:
+    """Lower is better: the worst feedback level, then the amount of errors and warnings"""
+    errors = warnings = 0
+    for fbg in fbc.feedback:
+        for fb in fbg.feedback:
+            if fb.level is FeedbackLevel.ERROR:
+                errors += 1
+            elif fb.level is FeedbackLevel.WARNING:
+                warnings += 1
+    return fbc.level, errors, warnings
+
+
+build_index = BuildIndex()
@@ -0,0 +1,30 @@
+import os
+from typing import Dict
+from sqlalchemy.ext.asyncio import AsyncSession
+from helpers.snapshot import Snapshot
+from models.config import Config
+from models.enums.config_key import ConfigKey
+
+
+class ConfigCache(Snapshot):
+    """Snapshot of the config table. It is refreshed by the /config commands"""
+    def __init__(self, ttl: float = None):
+        super().__init__(ttl)
+        self.values: Dict[ConfigKey, str] = {}
+
+    async def load(self, session: AsyncSession) -> None:
+        self.values = await Config.to_dict(session)
+
+    async def to_dict(self) -> Dict[ConfigKey, str]:
+        await self.ensure_loaded()
+        return self.values
+
+    async def get_value(self, key: ConfigKey) -> str:
+        await self.ensure_loaded()
+        return self.values[key]
+
+    async def get_int(self, key: ConfigKey) -> int:
+        return int(await self.get_value(key))
+
+
+config_cache = ConfigCache(float(os.getenv("CONFIG_CACHE_TTL")) if os.getenv("CONFIG_CACHE_TTL") else None)
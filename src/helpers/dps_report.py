@@ -0,0 +1,223 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+import ijson
+from exceptions import DpsReportException
+
+
+# Paths of the dps.report json that are used by the log checks and embeds (in ijson prefix notation).
+# Everything else (damage graphs, rotations, per-target stats, ...) is discarded while the json is streamed.
+LOG_JSON_FIELDS = {
+    "eiEncounterID", "fightName", "fightIcon", "isCM", "gW2Build", "success", "duration",
+    "players.item.account", "players.item.name", "players.item.profession", "players.item.healing",
+    "players.item.defenses.item.downCount", "players.item.defenses.item.deadCount",
+    "players.item.consumables.item.id", "players.item.consumables.item.time",
+    "players.item.buffUptimes.item.id", "players.item.buffUptimes.item.buffData.item.uptime",
+    "mechanics.item.name", "mechanics.item.fullName", "mechanics.item.mechanicsData.item.actor",
+}
+
+
+class LogJsonBuilder:
+    """Builds a compact log json from ijson basic_parse events, keeping only the given fields"""
+    def __init__(self, fields: set = None):
+        self.fields = fields if fields else LOG_JSON_FIELDS
+        # Containers that lead to one of the fields
+        self.ancestors = {""}
+        for field in self.fields:
+            parts = field.split(".")
+            self.ancestors.update(".".join(parts[:i]) for i in range(1, len(parts)))
+
+        self.result = None
+        # Stack of [container, key of the next value, path, whether the whole container is kept]
+        self.stack = []
+        self.skip_depth = 0
+
+    def event(self, event: str, value) -> None:
+        if self.skip_depth:
+            self.skip(event)
+            return
+
+        if event == "map_key":
+            self.stack[-1][1] = value
+            return
+        if event == "end_map" or event == "end_array":
+            self.stack.pop()
+            return
+
+        if self.stack:
+            parent, key, parent_path, keep_all = self.stack[-1]
+            if type(parent) is list:
+                path = parent_path + ".item" if parent_path else "item"
+            else:
+                path = parent_path + "." + key if parent_path else key
+        else:
+            parent, key, path, keep_all = None, None, "", False
+
+        if not keep_all:
+            if path in self.fields:
+                keep_all = True
+            elif path not in self.ancestors:
+                if event == "start_map" or event == "start_array":
+                    self.skip_depth = 1
+                return
+
+        if event == "start_map":
+            value = {}
+        elif event == "start_array":
+            value = []
+
+        if parent is None:
+            self.result = value
+        elif type(parent) is list:
+            parent.append(value)
+        else:
+            parent[key] = value
+
+        if event == "start_map" or event == "start_array":
+            self.stack.append([value, None, path, keep_all])
+
+    def skip(self, event: str) -> None:
+        # Most events of a log belong to unused containers, so this is kept as short as possible
+        if event == "start_map" or event == "start_array":
+            self.skip_depth += 1
+        elif event == "end_map" or event == "end_array":
+            self.skip_depth -= 1
+
+    def build(self, events) -> Dict:
+        for event, value in events:
+            if self.skip_depth:
+                self.skip(event)
+            else:
+                self.event(event, value)
+        return self.result
+
+
+class LogCache:
+    """
+    Compressed on-disk cache of parsed logs, keyed by a hash of the permalink and the parsed fields.
+    The least recently used logs are evicted once the cache grows above its size limit.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Logs parsed with a different set of fields get different keys
+        self.fields_hash = hashlib.sha256(",".join(sorted(LOG_JSON_FIELDS)).encode()).hexdigest()[:16]
+
+    def get_path(self, log_url: str) -> str:
+        key = hashlib.sha256(f"{self.fields_hash}:{log_url.strip().rstrip('/')}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, log_url: str) -> Dict | None:
+        path = self.get_path(log_url)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                log_json = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Mark as recently used
+        os.utime(path)
+        return log_json
+
+    def put(self, log_url: str, log_json: Dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first, so other processes never read a partially written log
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8") as f:
+                json.dump(log_json, f, separators=(",", ":"))
+            os.replace(tmp_path, self.get_path(log_url))
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json.gz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(file[1] for file in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+
+def get_log_cache() -> LogCache:
+    return LogCache(os.getenv("LOG_CACHE_DIR", "log-cache"), int(os.getenv("LOG_CACHE_MAX_MB", 500)) * 1024 * 1024)
+
+
+def load_log_json(log_url: str) -> Dict:
+    """Returns the parsed log from the log cache or downloads it"""
+    cache = get_log_cache()
+    # Checked again in the worker, the log might have been cached while this job was queued
+    log_json = cache.get(log_url)
+    if log_json is None:
+        log_json = download_log_json(log_url)
+        try:
+            cache.put(log_url, log_json)
+        except OSError:
+            # The log can still be checked without the cache
+            pass
+    return log_json
+
+
+def download_log_json(log_url: str) -> Dict:
+    """Downloads the json of a dps.report log and parses the fields used by the bot while it is streamed"""
+    request = urllib.request.Request("https://dps.report/getJson?permalink=" + log_url,
+                                     headers={"User-Agent": "crossroads-inn-bot"})
+    try:
+        with urllib.request.urlopen(request, timeout=120) as r:
+            return LogJsonBuilder().build(ijson.basic_parse(r, use_float=True))
+    except urllib.error.HTTPError as e:
+        raise DpsReportException(f"{log_url}\n{e.code}: {e.read().decode(errors='replace')}")
+    except Exception as e:
+        raise DpsReportException(f"{log_url}\n{e}")
+
+
+executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor
+    if not executor:
+        # Spawn fresh workers instead of forking the bot with its open connections
+        executor = ProcessPoolExecutor(max_workers=int(os.getenv("LOG_PARSER_WORKERS", 2)),
+                                       mp_context=multiprocessing.get_context("spawn"))
+    return executor
+
+
+def shutdown_executor() -> None:
+    global executor
+    if executor:
+        # Called on the event loop, so queued logs are cancelled and running workers are not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+
+
+async def get_log_json(log_url: str) -> Dict:
+    """
+    Returns a cached log without waiting for the worker processes. Other logs are downloaded in a worker process,
+    so decoding large logs does not block the event loop. Only the compact log json is sent back.
+    """
+    log_json = await asyncio.to_thread(get_log_cache().get, log_url)
+    if log_json is not None:
+        return log_json
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), load_log_json, log_url)
@@ -1,9 +1,9 @@
-from typing import Dict
 import discord
 from discord import Embed
 from sqlalchemy import select, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 from exceptions import APIException
+from helpers.log_digest import LogDigest
 from models.enums.log_status import LogStatus
 from models.enums.role import Role
 from models.log import Log
@@ -40,14 +40,18 @@ def generate_error_embed(error: Exception):
 async def get_progress_embed(session: AsyncSession, discord_user: discord.User) -> Embed:
     embed = discord.Embed(title="Tier Progress", color=discord.Color.green())
     embed.set_author(name=discord_user.display_name, icon_url=discord_user.avatar)
-    stmt = select(Log).where(Log.discord_user_id == discord_user.id).where(Log.status != LogStatus.DENIED).order_by(desc(Log.status))
+    # Load the logs of all tiers and roles at once and group them afterwards
+    stmt = select(Log.tier, Log.role, Log.fight_name, Log.log_url, Log.status)\
+        .where(Log.discord_user_id == discord_user.id).where(Log.status != LogStatus.DENIED).order_by(desc(Log.status))
+    logs_by_group = {}
+    for log in await session.execute(stmt):
+        group = 2 if log.tier == 2 else (log.tier, log.role)
+        logs_by_group.setdefault(group, []).append(log)
 
     # Tier 2
-    logs = (await session.execute(stmt.where(Log.tier == 2))).scalars().all()
-
     value = ""
     accepted = 0
-    for log in logs:
+    for log in logs_by_group.get(2, []):
         value += f"[{log.fight_name}]({log.log_url}): {log.status}\n"
         accepted += 1 if log.status == LogStatus.REVIEW_ACCEPTED else 0
     embed.add_field(name=f"Tier 2:", value=f"Progress: {accepted}/2\n" + value, inline=False)
@@ -56,28 +60,24 @@ async def get_progress_embed(session: AsyncSession, discord_user: discord.User)
     for role in Role:
         if role == Role.NONE:
             continue
-        logs = (await session.execute(stmt.where(Log.tier == 3).where(Log.role == role))).scalars().all()
         value = ""
         accepted = 0
-        for log in logs:
+        for log in logs_by_group.get((3, role), []):
             value += f"[{log.fight_name}]({log.log_url}): {log.status}\n"
             accepted += 1 if log.status == LogStatus.REVIEW_ACCEPTED else 0
         embed.add_field(name=f"Tier 3: {role.value}", value=f"Progress: {accepted}/3\n" + value, inline=False)
 
     return embed
 
-def get_log_embed(log_url: str, log_json: Dict, discord_user: discord.User, account_name: str, role: Role, tier: int) -> Embed:
-    embed = Embed(title=f"{log_json['fightName']}", colour=discord.Color.blurple(), url=log_url)
+def get_log_embed(log_url: str, digest: LogDigest, discord_user: discord.User, account_name: str, role: Role, tier: int) -> Embed:
+    embed = Embed(title=f"{digest.fight_name}", colour=discord.Color.blurple(), url=log_url)
     embed.set_author(name=discord_user.display_name, icon_url=discord_user.avatar)
-    embed.set_thumbnail(url=log_json["fightIcon"])
-    embed.set_footer(text=f"eiEncounterID: {log_json['eiEncounterID']} | gW2Build: {log_json['gW2Build']}\n")
-    for player in log_json["players"]:
-        if player['account'] == account_name:
-            profession = player['profession']
-            break
-    else:
+    embed.set_thumbnail(url=digest.fight_icon)
+    embed.set_footer(text=f"eiEncounterID: {digest.encounter_id} | gW2Build: {digest.gw2_build}\n")
+    player = digest.get_player(account_name)
+    if not player:
         raise Exception(f"Could not find account {account_name} in log")
 
     embed.description = f"**Tier:** {tier}\n**Role:** {role.value}\n\n**Account:** {account_name}\n" \
-                        f"**Profession:** {profession}\n**Duration:** {log_json['duration']}"
+                        f"**Profession:** {player.profession}\n**Duration:** {digest.duration}"
     return embed
\ No newline at end of file
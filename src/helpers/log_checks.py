@@ -1,66 +1,65 @@
-from typing import Dict
-from sqlalchemy import select
+from sqlalchemy import select, func, case
 from database import Session
-from models.config import Config
+from helpers.config_cache import config_cache
+from helpers.log_digest import LogDigest, PlayerDigest, BLOOD_MAGIC, EMBOLDENED
+from helpers.rules import rules
 from models.enums.config_key import ConfigKey
 from models.enums.log_status import LogStatus
 from models.enums.mech_mode import MechMode
 from models.enums.pools import BossLogPool
 from models.feedback import FeedbackGroup, FeedbackLevel, Feedback, FeedbackCollection
 from models.log import Log
-from models.mech import Mech
 
 
-async def check_log(log_json: Dict, account_name: str, tier: int, discord_user_id: int, log_url: str, log: Log) -> FeedbackCollection:
+async def check_log(digest: LogDigest, account_name: str, tier: int, discord_user_id: int, log_url: str, log: Log) -> FeedbackCollection:
     fbc = FeedbackCollection()
 
     # Get config
-    async with Session.begin() as session:
-        config = await Config.to_dict(session)
+    config = await config_cache.to_dict()
 
     # General log checks
     fbg_valid = FeedbackGroup(message="Checking if log is valid")
     fbc.add(fbg_valid)
 
-    for player in log_json["players"]:
-        if player['account'] == account_name:
-            break
-    else:
+    player = digest.get_player(account_name)
+    if not player:
         fbg_valid.add(Feedback(f"Could not find account {account_name} in log", FeedbackLevel.ERROR))
 
     # Check version
-    if log_json["gW2Build"] < int(config[ConfigKey.MIN_GW2_BUILD]):
+    if digest.gw2_build < int(config[ConfigKey.MIN_GW2_BUILD]):
         fbg_valid.add(Feedback(f"Log is from before the latest major balance patch.", FeedbackLevel.ERROR))
 
-    async with Session.begin() as session:
-        # Checkm if this exact log was already submitted
-        stmt = select(Log).where(Log.log_url == log_url).where(Log.discord_user_id == discord_user_id).where(Log.status != LogStatus.DENIED)
-        if (await session.execute(stmt)).scalar():
-            fbg_valid.add(Feedback(f"You already submitted this log.", FeedbackLevel.ERROR))
-
-        # Check if a log for this boss was already submitted
-        stmt = select(Log).where(Log.discord_user_id == discord_user_id) \
-            .where(Log.status != LogStatus.DENIED).where(Log.status != LogStatus.REVIEW_DENIED) \
-            .where(Log.encounter_id == log_json["eiEncounterID"]).where(Log.tier == tier).where(Log.role == log.role)
-        if (await session.execute(stmt)).scalar():
-            fbg_valid.add(Feedback(f"You already submitted a log for this boss.", FeedbackLevel.ERROR))
-
-        # Assign boss log pool
-        await log.assign_pool(session)
-
-    # Count boss pools
-    stmt = select(Log).where(Log.discord_user_id == discord_user_id) \
-        .where(Log.status != LogStatus.DENIED).where(Log.status != LogStatus.REVIEW_DENIED).where(Log.tier == tier)
+    # Assign boss log pool
+    await log.assign_pool()
+
+    # Count boss pools of the submitted logs and check for duplicates in a single query
+    not_review_denied = Log.status != LogStatus.REVIEW_DENIED
+    same_boss = not_review_denied & (Log.encounter_id == digest.encounter_id) & (Log.tier == tier) & (Log.role == log.role)
+    stmt = select(Log.assigned_pool,
+                  func.sum(case((not_review_denied & (Log.tier == tier), 1), else_=0)),
+                  func.max(case((Log.log_url == log_url, 1), else_=0)),
+                  func.max(case((same_boss, 1), else_=0))) \
+        .where(Log.discord_user_id == discord_user_id).where(Log.status != LogStatus.DENIED) \
+        .group_by(Log.assigned_pool)
     boss_pools = {pool: 0 for pool in BossLogPool}
-    async with Session.begin() as session:
-        submitted_logs = (await session.execute(stmt)).scalars().all()
+    duplicate_log = False
+    duplicate_boss = False
+    async with Session() as session:
+        for pool, count, is_duplicate_log, is_duplicate_boss in await session.execute(stmt):
+            boss_pools[pool] += count
+            duplicate_log = duplicate_log or bool(is_duplicate_log)
+            duplicate_boss = duplicate_boss or bool(is_duplicate_boss)
 
-        # Check already submitted logs
-        for l in submitted_logs:
-            boss_pools[l.assigned_pool] += 1
+    # Check this log
+    boss_pools[log.assigned_pool] += 1
 
-        # Check this log
-        boss_pools[log.assigned_pool] += 1
+    # Check if this exact log was already submitted
+    if duplicate_log:
+        fbg_valid.add(Feedback(f"You already submitted this log.", FeedbackLevel.ERROR))
+
+    # Check if a log for this boss was already submitted
+    if duplicate_boss:
+        fbg_valid.add(Feedback(f"You already submitted a log for this boss.", FeedbackLevel.ERROR))
 
     # Check boss pool
     if boss_pools[BossLogPool.NOT_ALLOWED]:
@@ -83,81 +82,54 @@ async def check_log(log_json: Dict, account_name: str, tier: int, discord_user_i
     fbg_general = FeedbackGroup(message="Checking performance")
     fbc.add(fbg_general)
 
-    if not log_json["success"]:
+    if not digest.success:
         fbg_general.add(Feedback("Boss was not killed", FeedbackLevel.ERROR))
 
-    squad_downs = 0
-    squad_deaths = 0
-    found_blood_magic = False
-    is_emboldened = False
-    for player in log_json["players"]:
-        if player["account"] == account_name:
-            if player["defenses"][0]["deadCount"] > 0:
-                fbg_general.add(Feedback(f"You've died. You must be alive at the end of the fight.", FeedbackLevel.ERROR))
-
-            if player["defenses"][0]["downCount"] > int(config[ConfigKey.MAX_PLAYER_DOWNS]):
-                fbg_general.add(Feedback(f"You have downed more than {config[ConfigKey.MAX_PLAYER_DOWNS]} times. ({player['defenses'][0]['downCount']})", FeedbackLevel.ERROR))
-
-            check_food(player, fbg_general)
+    if player.deaths > 0:
+        fbg_general.add(Feedback(f"You've died. You must be alive at the end of the fight.", FeedbackLevel.ERROR))
 
-        squad_downs += player["defenses"][0]["downCount"]
-        squad_deaths += player["defenses"][0]["deadCount"]
+    if player.downs > int(config[ConfigKey.MAX_PLAYER_DOWNS]):
+        fbg_general.add(Feedback(f"You have downed more than {config[ConfigKey.MAX_PLAYER_DOWNS]} times. ({player.downs})", FeedbackLevel.ERROR))
 
-        for b in player["buffUptimes"]:
-            if b["id"] == 29726:
-                found_blood_magic = True
-            if b["id"] == 68087:
-                is_emboldened = True
+    check_food(player, fbg_general)
 
-    if squad_downs > int(config[ConfigKey.MAX_SQUAD_DOWNS]):
-        fbg_general.add(Feedback(f"Your squad downed more than {config[ConfigKey.MAX_SQUAD_DOWNS]} times. ({squad_downs})", FeedbackLevel.ERROR))
+    if digest.squad_downs > int(config[ConfigKey.MAX_SQUAD_DOWNS]):
+        fbg_general.add(Feedback(f"Your squad downed more than {config[ConfigKey.MAX_SQUAD_DOWNS]} times. ({digest.squad_downs})", FeedbackLevel.ERROR))
 
-    if squad_deaths > int(config[ConfigKey.MAX_SQUAD_DEATHS]):
-        fbg_general.add(Feedback(f"Your squad has more than {config[ConfigKey.MAX_SQUAD_DEATHS]} deaths. ({squad_deaths})", FeedbackLevel.ERROR))
+    if digest.squad_deaths > int(config[ConfigKey.MAX_SQUAD_DEATHS]):
+        fbg_general.add(Feedback(f"Your squad has more than {config[ConfigKey.MAX_SQUAD_DEATHS]} deaths. ({digest.squad_deaths})", FeedbackLevel.ERROR))
 
-    if found_blood_magic:
+    if BLOOD_MAGIC in digest.squad_buff_ids:
         fbg_general.add(Feedback(f"We do not allow logs with a Blood Magic Necromancer present.", FeedbackLevel.ERROR))
 
-    if is_emboldened:
+    if EMBOLDENED in digest.squad_buff_ids:
         fbg_general.add(Feedback(f"We do not allow logs with Emboldened Mode active.", FeedbackLevel.ERROR))
 
-    check_healers(log_json, fbg_general)
+    check_healers(digest, fbg_general)
 
     # Check mechanics
     fbg_mech = FeedbackGroup(message=f"Checking mechanics")
     fbc.add(fbg_mech)
-    await check_mechanics(log_json, account_name, fbg_mech)
+    await check_mechanics(digest, account_name, fbg_mech)
 
     return fbc
 
-def check_food(player_data: Dict, fbg: FeedbackGroup):
+def check_food(player: PlayerDigest, fbg: FeedbackGroup):
     # no consumables at all
-    if not player_data['consumables']:
+    if not player.consumables:
         fbg.add(Feedback("Did not use food and/or utility.", FeedbackLevel.ERROR))
         return fbg
 
-    consumable_data = player_data['consumables']
-
-    consumable_ids = []
-
-    # get used consumable ids
-    for c in consumable_data:
-        # don't add Reinforced Armour (ID: 9283)
-        if not c['id'] == 9283:
-            consumable_ids.append(c['id'])
-
-    consumables_as_buffs = {}
+    consumable_data = player.consumables
 
-    # get according buffUptimes
-    for b in player_data['buffUptimes']:
-        if b['id'] in consumable_ids:
-            consumables_as_buffs[b['id']] = b['buffData']
+    # get used consumable ids, don't add Reinforced Armour (ID: 9283)
+    consumable_ids = {c['id'] for c in consumable_data if c['id'] != 9283}
 
     # Diminished
-    if 46668 in consumables_as_buffs.keys() and consumables_as_buffs[46668][0]['uptime'] >= 25:
+    if 46668 in consumable_ids and 46668 in player.buff_uptimes and player.buff_uptimes[46668][0]['uptime'] >= 25:
         fbg.add(Feedback("Did not refresh utility.", FeedbackLevel.ERROR))
     # Malnourished
-    if 46587 in consumables_as_buffs.keys() and consumables_as_buffs[46587][0]['uptime'] >= 25:
+    if 46587 in consumable_ids and 46587 in player.buff_uptimes and player.buff_uptimes[46587][0]['uptime'] >= 25:
         fbg.add(Feedback("Did not refresh food.", FeedbackLevel.ERROR))
 
     # check if started fight with food and consumables or had consumable activity in the first ten seconds
@@ -169,68 +141,49 @@ def check_food(player_data: Dict, fbg: FeedbackGroup):
     if tmp_consumable_counter < 2:
         fbg.add(Feedback("Did not start the fight with food and/or utility.", FeedbackLevel.ERROR))
 
-def check_healers(log_json: Dict, fbg: FeedbackGroup) -> None:
-    amount_of_healers = 0
-
-    for player in log_json["players"]:
-        if player["healing"] == 10:
-            amount_of_healers += 1
-            if player["profession"] == "Chronomancer":
-                # check for heal signet
-                for buff in player["buffUptimes"]:
-                    # Ether Signet -> not a healer
-                    if buff["id"] == 21751:
-                        amount_of_healers -= 1
-
+def check_healers(digest: LogDigest, fbg: FeedbackGroup) -> None:
     # HK counts as healer at deimos
-    if (int(log_json["eiEncounterID"]) == 132100 and amount_of_healers <= 3) or amount_of_healers <= 2:
+    if (digest.encounter_id == 132100 and digest.healers <= 3) or digest.healers <= 2:
         return
     fbg.add(Feedback("Potentially too many healers.", FeedbackLevel.WARNING))
 
 
-async def check_mechanics(log_json: Dict, account_name: str, fbg_mech: FeedbackGroup, mech_id: int = None, debug: bool = False) -> None:
-    stmt = select(Mech).where(Mech.encounter_id == log_json["eiEncounterID"])
+async def check_mechanics(digest: LogDigest, account_name: str, fbg_mech: FeedbackGroup, mech_id: int = None, debug: bool = False) -> None:
+    mechs = await rules.get_mechs(digest.encounter_id)
     if mech_id:
-        stmt = stmt.where(Mech.id == mech_id)
+        mechs = [mech for mech in mechs if mech.id == mech_id]
 
     # Get character name
-    character_name = None
-    for player in log_json["players"]:
-        if account_name == player["account"]:
-            character_name = player["name"]
-            break
-
-    if not character_name:
+    player = digest.get_player(account_name)
+    if not player:
         raise Exception(f"Could not find character name for account {account_name}")
+    character_name = player.name
 
     # Check mechanics
-    async with Session.begin() as session:
-        mechs = (await session.execute(stmt)).scalars().all()
-        for mech in mechs:
-            # Get amount of mechanic
-            amount = 0
-            full_name = None
-            for mechanic in log_json["mechanics"]:
-                if mechanic["name"] == mech.name:
-                    full_name = mechanic["fullName"] if "fullName" in mechanic else mech.name
-                    for mechanic_data in mechanic["mechanicsData"]:
-                        if mech.mode == MechMode.PLAYER and mechanic_data["actor"] == character_name:
-                            amount += 1
-                        elif mech.mode == MechMode.SQUAD:
-                            amount += 1
-
-            if debug and full_name:
-                fbg_mech.add(Feedback(f"Found {amount} {full_name} ({mech.name}) ({mech.max_amount} allowed)",
-                                      FeedbackLevel.ERROR if amount > mech.max_amount else FeedbackLevel.SUCCESS))
-                continue
-            if debug and not full_name:
-                fbg_mech.add(Feedback(f"Could not find {mech.name} in log. "
-                                      f"Either the mech name is wrong or no one got hit by the mechanic. "
-                                      f"You can manually check the log to verify if the check is working correctly.",
-                                      FeedbackLevel.WARNING))
-                continue
-
-
-            if amount > mech.max_amount:
-                fbg_mech.add(Feedback(f"{'You' if mech.mode == MechMode.PLAYER else 'Your squad'} failed {full_name}"
-                                      f" {amount} time{'s' if amount > 1 else ''}. ({mech.max_amount} allowed)", FeedbackLevel.ERROR))
\ No newline at end of file
+    for mech in mechs:
+        # Get amount of mechanic
+        amount = 0
+        full_name = None
+        mechanic = digest.get_mechanic(mech.name)
+        if mechanic:
+            full_name = mechanic.full_name
+            if mech.mode == MechMode.PLAYER:
+                amount = mechanic.actors[character_name]
+            elif mech.mode == MechMode.SQUAD:
+                amount = mechanic.total
+
+        if debug and full_name:
+            fbg_mech.add(Feedback(f"Found {amount} {full_name} ({mech.name}) ({mech.max_amount} allowed)",
+                                  FeedbackLevel.ERROR if amount > mech.max_amount else FeedbackLevel.SUCCESS))
+            continue
+        if debug and not full_name:
+            fbg_mech.add(Feedback(f"Could not find {mech.name} in log. "
+                                  f"Either the mech name is wrong or no one got hit by the mechanic. "
+                                  f"You can manually check the log to verify if the check is working correctly.",
+                                  FeedbackLevel.WARNING))
+            continue
+
+
+        if amount > mech.max_amount:
+            fbg_mech.add(Feedback(f"{'You' if mech.mode == MechMode.PLAYER else 'Your squad'} failed {full_name}"
+                                  f" {amount} time{'s' if amount > 1 else ''}. ({mech.max_amount} allowed)", FeedbackLevel.ERROR))
\ No newline at end of file
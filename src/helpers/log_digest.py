@@ -0,0 +1,77 @@
+from collections import Counter
+from typing import Dict, KeysView, List, Set
+
+
+# Buff ids used by the log checks
+BLOOD_MAGIC = 29726
+EMBOLDENED = 68087
+ETHER_SIGNET = 21751
+
+
+class PlayerDigest:
+    def __init__(self, player: Dict):
+        self.account: str = player["account"]
+        self.name: str = player["name"]
+        self.profession: str = player["profession"]
+        self.healing: int = player["healing"]
+        self.downs: int = player["defenses"][0]["downCount"]
+        self.deaths: int = player["defenses"][0]["deadCount"]
+        self.consumables: List[Dict] = player.get("consumables", [])
+        self.buff_uptimes: Dict[int, List[Dict]] = {buff["id"]: buff["buffData"] for buff in player.get("buffUptimes", [])}
+
+    @property
+    def buff_ids(self) -> KeysView[int]:
+        return self.buff_uptimes.keys()
+
+    @property
+    def is_healer(self) -> bool:
+        # Chronomancers with Ether Signet are not healers
+        return self.healing == 10 and not (self.profession == "Chronomancer" and ETHER_SIGNET in self.buff_ids)
+
+
+class MechanicDigest:
+    def __init__(self, name: str, full_name: str):
+        self.name = name
+        self.full_name = full_name
+        self.total = 0
+        # Amount of hits per character name
+        self.actors: Counter[str] = Counter()
+
+
+class LogDigest:
+    """Everything the log checks need from a log json, collected in a single pass over the players"""
+    def __init__(self, log_json: Dict):
+        self.encounter_id: int = int(log_json["eiEncounterID"])
+        self.fight_name: str = log_json["fightName"]
+        self.fight_icon: str = log_json["fightIcon"]
+        self.is_cm: bool = log_json["isCM"]
+        self.gw2_build: int = log_json["gW2Build"]
+        self.success: bool = log_json["success"]
+        self.duration: str = log_json["duration"]
+
+        self.players: Dict[str, PlayerDigest] = {}
+        self.squad_downs = 0
+        self.squad_deaths = 0
+        self.squad_buff_ids: Set[int] = set()
+        self.healers = 0
+        for player_json in log_json["players"]:
+            player = PlayerDigest(player_json)
+            self.players.setdefault(player.account, player)
+            self.squad_downs += player.downs
+            self.squad_deaths += player.deaths
+            self.squad_buff_ids.update(player.buff_ids)
+            if player.is_healer:
+                self.healers += 1
+
+        self.mechanics: Dict[str, MechanicDigest] = {}
+        for mechanic in log_json.get("mechanics", []):
+            mechanic_digest = self.mechanics.setdefault(mechanic["name"], MechanicDigest(mechanic["name"], mechanic["name"]))
+            mechanic_digest.full_name = mechanic.get("fullName", mechanic["name"])
+            mechanic_digest.total += len(mechanic["mechanicsData"])
+            mechanic_digest.actors.update(data["actor"] for data in mechanic["mechanicsData"])
+
+    def get_player(self, account_name: str) -> PlayerDigest | None:
+        return self.players.get(account_name)
+
+    def get_mechanic(self, name: str) -> MechanicDigest | None:
+        return self.mechanics.get(name)
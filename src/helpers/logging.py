@@ -2,9 +2,8 @@ import datetime
 import discord.ext.commands
 from discord import Embed
 
-from database import Session
+from helpers.config_cache import config_cache
 from models.build import Build
-from models.config import Config
 from models.enums.config_key import ConfigKey
 from models.equipment import Equipment
 from models.feedback import FeedbackCollection
@@ -25,6 +24,5 @@ async def log_gear_check(bot: discord.ext.commands.Bot, interaction: discord.Int
 
 async def log_to_channel(bot: discord.ext.commands.Bot, embed: Embed) -> None:
     embed.timestamp = datetime.datetime.now()
-    async with Session.begin() as session:
-        log_channel_id = int((await Config.get_value(session, ConfigKey.LOG_CHANNEL_ID)))
-        await bot.get_channel(log_channel_id).send(embed=embed)
\ No newline at end of file
+    log_channel_id = await config_cache.get_int(ConfigKey.LOG_CHANNEL_ID)
+    await bot.get_channel(log_channel_id).send(embed=embed)
\ No newline at end of file
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """Size-bounded in-memory cache that evicts the least recently used entries first"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self.data:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __str__(self):
+        return f"Entries: {len(self)}/{self.max_size}\nHits: {self.hits}\nMisses: {self.misses}\nEvictions: {self.evictions}"
@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    def __init__(self, requests_per_minute: int, burst: int = None):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst if burst else requests_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    @property
+    def is_full(self) -> bool:
+        self.refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self) -> float:
+        """Takes one token and returns how many seconds the caller had to wait for it"""
+        start = time.monotonic()
+        # The lock makes waiting callers queue up in order
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+        return time.monotonic() - start
+
+
+class RateLimiterStats:
+    def __init__(self):
+        self.requests = 0
+        self.queued = 0
+        self.waited_ms = 0
+        self.retries = 0
+
+    def __str__(self):
+        return f"Requests: {self.requests}\nCurrently queued: {self.queued}\n" \
+               f"Total wait time: {round(self.waited_ms)} ms\nRetries: {self.retries}"
+
+
+class RateLimiter:
+    """
+    Limits the requests to an API globally and per API key. Both limits are token buckets, so short bursts are allowed
+    and everything above the limit is queued instead of failing.
+    """
+    def __init__(self, requests_per_minute: int, requests_per_minute_per_key: int):
+        self.requests_per_minute_per_key = requests_per_minute_per_key
+        self.bucket = TokenBucket(requests_per_minute)
+        self.key_buckets: Dict[str, TokenBucket] = {}
+        self.stats = RateLimiterStats()
+
+    def get_key_bucket(self, api_key: str) -> TokenBucket:
+        # Only keep a hash of the api key in memory
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        if key not in self.key_buckets:
+            # Drop buckets of keys that have been idle long enough to be full again
+            if len(self.key_buckets) > 1000:
+                self.key_buckets = {k: bucket for k, bucket in self.key_buckets.items() if not bucket.is_full}
+            self.key_buckets[key] = TokenBucket(self.requests_per_minute_per_key)
+        return self.key_buckets[key]
+
+    async def acquire(self, api_key: str = None) -> None:
+        self.stats.requests += 1
+        self.stats.queued += 1
+        try:
+            waited = 0
+            if api_key:
+                waited += await self.get_key_bucket(api_key).acquire()
+            waited += await self.bucket.acquire()
+            self.stats.waited_ms += waited * 1000
+        finally:
+            self.stats.queued -= 1
@@ -0,0 +1,56 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from helpers.snapshot import Snapshot
+from models.boss import Boss
+from models.enums.pools import KillProofPool
+from models.mech import Mech
+
+
+class Rules(Snapshot):
+    """Snapshot of the boss and mech tables used for the KP and log checks. It is refreshed by the /boss and /mech commands"""
+    def __init__(self):
+        super().__init__()
+        self.bosses: Dict[Tuple[int, bool], Boss] = {}
+        self.kp_bosses: List[Boss] = []
+        self.kp_bosses_by_achievement: Dict[int, List[Boss]] = {}
+        self.mechs_by_encounter: Dict[int, List[Mech]] = {}
+
+    async def load(self, session: AsyncSession) -> None:
+        bosses = await Boss.all(session)
+        mechs = (await session.execute(select(Mech).order_by(Mech.id))).scalars().all()
+
+        bosses_by_key = {(boss.encounter_id, boss.is_cm): boss for boss in bosses}
+        kp_bosses = [boss for boss in bosses if boss.kp_pool != KillProofPool.NOT_ALLOWED]
+        kp_bosses_by_achievement = {}
+        for boss in kp_bosses:
+            kp_bosses_by_achievement.setdefault(boss.achievement_id, []).append(boss)
+        mechs_by_encounter = {}
+        for mech in mechs:
+            mechs_by_encounter.setdefault(mech.encounter_id, []).append(mech)
+
+        self.bosses, self.kp_bosses, self.kp_bosses_by_achievement, self.mechs_by_encounter = \
+            bosses_by_key, kp_bosses, kp_bosses_by_achievement, mechs_by_encounter
+
+    async def get_boss(self, encounter_id: int, is_cm: bool) -> Boss | None:
+        await self.ensure_loaded()
+        boss = self.bosses.get((encounter_id, is_cm))
+        if not boss and is_cm:
+            # If the log is a CM, but we don't have a CM boss, use the non-CM boss
+            boss = self.bosses.get((encounter_id, False))
+        return boss
+
+    async def get_mechs(self, encounter_id: int) -> List[Mech]:
+        await self.ensure_loaded()
+        return self.mechs_by_encounter.get(encounter_id, [])
+
+    async def get_kp_bosses(self) -> List[Boss]:
+        await self.ensure_loaded()
+        return self.kp_bosses
+
+    async def get_kp_bosses_by_achievement(self) -> Dict[int, List[Boss]]:
+        await self.ensure_loaded()
+        return self.kp_bosses_by_achievement
+
+
+rules = Rules()
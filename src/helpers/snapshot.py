@@ -0,0 +1,30 @@
+import asyncio
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Session
+
+
+class Snapshot:
+    """
+    In-memory copy of database tables. Subclasses load the tables in load and are refreshed by the commands that change
+    them. With a ttl the snapshot is also reloaded periodically, so changes made by other processes are picked up.
+    """
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl
+        self.lock = asyncio.Lock()
+        self.loaded_at: float | None = None
+
+    async def load(self, session: AsyncSession) -> None:
+        # Assign everything after the last await, so readers never see a half-loaded snapshot
+        raise NotImplementedError
+
+    async def refresh(self) -> None:
+        async with self.lock:
+            # Objects of a session that is not committed stay loaded after it is closed
+            async with Session() as session:
+                await self.load(session)
+            self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self) -> None:
+        if self.loaded_at is None or (self.ttl and time.monotonic() - self.loaded_at > self.ttl):
+            await self.refresh()
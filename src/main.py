@@ -2,6 +2,7 @@ import os
 import discord
 from discord.ext import commands
 from sqlalchemy import select
+from api import client
 from cogs.admin_commands import AdminCommands
 from cogs.mech_commands import MechCommands
 from models.application import Application
@@ -10,17 +11,31 @@ from models.enums.log_status import LogStatus
 from models.log import Log
 from views.application_overview import ApplicationOverview
 from database import init_db, Session
+from helpers.build_index import build_index
+from helpers.config_cache import config_cache
+from helpers.dps_report import shutdown_executor
+from helpers.rules import rules
 from views.log_review import LogReviewView
 from views.review import ReviewView
 
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+
+class Bot(commands.Bot):
+    async def close(self) -> None:
+        await client.close()
+        shutdown_executor()
+        await super().close()
+
+
+bot = Bot(command_prefix="!", intents=intents)
 
 
 @bot.event
 async def setup_hook():
+    await client.open()
     bot.add_view(ApplicationOverview(bot))
 
 
@@ -29,6 +44,9 @@ async def on_ready():
     await bot.add_cog(AdminCommands(bot))
     await bot.add_cog(MechCommands(bot))
     await init_db()
+    await rules.refresh()
+    await config_cache.refresh()
+    await build_index.refresh()
     async with Session.begin() as session:
         stmt = select(Application).where(Application.status == ApplicationStatus.WAITING_FOR_REVIEW)
         applications = (await session.execute(stmt)).scalars()
@@ -40,4 +58,6 @@ async def on_ready():
         for log in logs:
             bot.add_view(LogReviewView(bot, log.id))
 
-bot.run(os.getenv("DISCORD_TOKEN"))
\ No newline at end of file
+# Log parser worker processes import this module as well, so only start the bot when run as a script
+if __name__ == "__main__":
+    bot.run(os.getenv("DISCORD_TOKEN"))
\ No newline at end of file
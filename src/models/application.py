@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import ForeignKey, DateTime, func, BigInteger
+from sqlalchemy import ForeignKey, DateTime, func, BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from models.base import Base
 from models.enums.application_status import ApplicationStatus
@@ -7,6 +7,11 @@ from models.enums.application_status import ApplicationStatus
 
 class Application(Base):
     __tablename__ = "applications"
+    __table_args__ = (
+        Index("ix_applications_discord_user_id_status", "discord_user_id", "status"),
+        Index("ix_applications_status", "status"),
+        Index("ix_applications_time_created", "time_created"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     discord_user_id: Mapped[int] = mapped_column(BigInteger)
@@ -1,6 +1,20 @@
+from sqlalchemy import Insert
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import DeclarativeBase
 
 
 class Base(DeclarativeBase):
     def __init__(self):
         super().__init__()
+
+
+def insert_ignore(dialect_name: str, model) -> Insert:
+    """INSERT that skips rows whose primary key already exists instead of failing the whole statement"""
+    index_elements = [column.name for column in model.__table__.primary_key]
+    match dialect_name:
+        case "postgresql":
+            return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+        case "sqlite":
+            return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+        case _:
+            raise NotImplementedError(f"Unsupported database: {dialect_name}")
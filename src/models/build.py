@@ -1,13 +1,18 @@
 from typing import Optional
-from sqlalchemy import ForeignKey, select
+from sqlalchemy import Connection, ForeignKey, Index, String, event, inspect, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
 from models.base import Base
 from models.enums.profession import Profession
 
 
 class Build(Base):
     __tablename__ = "builds"
+    __table_args__ = (
+        Index("ix_builds_profession_archived", "profession", "archived"),
+        Index("ix_builds_name", "name"),
+        Index("ix_builds_url", "url"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     archived: Mapped[bool] = mapped_column(default=False)
@@ -16,6 +21,8 @@ class Build(Base):
     profession: Mapped[Profession]
     equipment_id: Mapped[int] = mapped_column(ForeignKey("equipment.id"), nullable=True)
     equipment = relationship("Equipment", foreign_keys=[equipment_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
+    # Equipment.fingerprint of the equipment, set when the build is saved
+    fingerprint: Mapped[Optional[str]] = mapped_column(String(32))
 
     def __str__(self):
         return f"{self.name}{' (' + self.url + ')' if self.url else ''}:\n{self.equipment}"
@@ -44,4 +51,22 @@ class Build(Base):
         return instance
 
     async def archive(self):
-        self.archived = True
\ No newline at end of file
+        self.archived = True
+
+
+@event.listens_for(Build, "before_insert")
+@event.listens_for(Build, "before_update")
+def set_fingerprint(mapper, connection, build: Build) -> None:
+    build.fingerprint = build.equipment.fingerprint if build.equipment else None
+
+
+def migrate_builds(conn: Connection) -> None:
+    """Adds the fingerprint column to existing databases and sets the fingerprint of builds that were saved without one"""
+    if "fingerprint" not in {column["name"] for column in inspect(conn).get_columns("builds")}:
+        conn.execute(text("ALTER TABLE builds ADD COLUMN fingerprint VARCHAR(32)"))
+
+    with Session(bind=conn) as session:
+        for build in session.execute(select(Build).where(Build.fingerprint.is_(None))).scalars():
+            if build.equipment:
+                build.fingerprint = build.equipment.fingerprint
+        session.flush()
@@ -1,58 +1,99 @@
-from copy import deepcopy
-from typing import List
-from sqlalchemy import ForeignKey
+import hashlib
+import json
 from discord import Embed
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from typing import Dict, List
+from sqlalchemy import JSON, Connection, MetaData, Table, event, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column, object_session, reconstructor
 from models.base import Base
 from models.enums.equipment_slot import EquipmentSlot
 from models.enums.rarity import Rarity
 from models.feedback import FeedbackCollection, FeedbackGroup, Feedback, FeedbackLevel
+from models.item import Item, ItemRecord, item_record_cache
+from models.stats import EquipmentStats
 
 
 class Equipment(Base):
     __tablename__ = "equipment"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    stats_id = mapped_column(ForeignKey("equipment_stats.id"), nullable=True)
-    stats = relationship("EquipmentStats", foreign_keys=[stats_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
+    # Hashes of the item records (in the order of EquipmentSlot) and the stats in a single column, see to_data
+    data: Mapped[dict] = mapped_column(JSON, nullable=True)
+
+    # Loaded from data, not mapped to columns
+    stats = None
 
     # Armor
-    helm_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    helm = relationship("Item", foreign_keys=[helm_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    shoulders_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    shoulders = relationship("Item", foreign_keys=[shoulders_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    coat_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    coat = relationship("Item", foreign_keys=[coat_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    gloves_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    gloves = relationship("Item", foreign_keys=[gloves_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    leggings_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    leggings = relationship("Item", foreign_keys=[leggings_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    boots_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    boots = relationship("Item", foreign_keys=[boots_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
+    helm = None
+    shoulders = None
+    coat = None
+    gloves = None
+    leggings = None
+    boots = None
 
     # Trinkets
-    backpack_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    backpack = relationship("Item", foreign_keys=[backpack_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    accessory_1_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    accessory_1 = relationship("Item", foreign_keys=[accessory_1_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    accessory_2_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    accessory_2 = relationship("Item", foreign_keys=[accessory_2_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    amulet_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    amulet = relationship("Item", foreign_keys=[amulet_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    ring_1_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    ring_1 = relationship("Item", foreign_keys=[ring_1_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    ring_2_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    ring_2 = relationship("Item", foreign_keys=[ring_2_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
+    backpack = None
+    accessory_1 = None
+    accessory_2 = None
+    amulet = None
+    ring_1 = None
+    ring_2 = None
 
     # Weapons
-    weapon_a1_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    weapon_a1 = relationship("Item", foreign_keys=[weapon_a1_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    weapon_a2_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    weapon_a2 = relationship("Item", foreign_keys=[weapon_a2_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    weapon_b1_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    weapon_b1 = relationship("Item", foreign_keys=[weapon_b1_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
-    weapon_b2_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=True)
-    weapon_b2 = relationship("Item", foreign_keys=[weapon_b2_id], lazy="joined", single_parent=True, cascade="all, delete, delete-orphan")
+    weapon_a1 = None
+    weapon_a2 = None
+    weapon_b1 = None
+    weapon_b2 = None
+
+    @reconstructor
+    def init_on_load(self):
+        if not self.data:
+            return
+        missing_items = {entry for entry in self.data["slots"] if isinstance(entry, str) and entry not in item_record_cache}
+        if missing_items:
+            # Runs while the equipment is loaded, so the records are loaded with the same session
+            stmt = select(ItemRecord.hash, ItemRecord.data).where(ItemRecord.hash.in_(missing_items))
+            item_record_cache.update(object_session(self).execute(stmt).tuples().all())
+        self.load_data(self.data)
+
+    def to_data(self) -> dict:
+        return {"slots": [item.content_hash if item else None for item in map(self.get_item, EquipmentSlot)],
+                "stats": self.stats.to_data() if self.stats else None}
+
+    def load_data(self, data: dict) -> None:
+        for slot, entry in zip(EquipmentSlot, data["slots"]):
+            # Equipment that was saved before items were stored as records contains the item itself
+            if isinstance(entry, str):
+                if entry not in item_record_cache:
+                    raise Exception(f"Item record {entry} of equipment {self.id} is missing")
+                entry = item_record_cache[entry]
+            setattr(self, slot.value, Item.from_data(slot, entry) if entry else None)
+        self.stats = EquipmentStats.from_data(data["stats"]) if data["stats"] else None
+
+    @staticmethod
+    async def prune_items(session: AsyncSession) -> int:
+        """
+        Deletes item records that are not referenced by any equipment and returns how many were deleted.
+        Saving equipment always inserts its records, so on PostgreSQL the table lock waits for running saves and
+        blocks new ones until the transaction ends. SQLite only allows one writer at a time
+        """
+        dialect_name = (await session.connection()).dialect.name
+        match dialect_name:
+            case "postgresql":
+                await session.execute(text("LOCK TABLE item_records IN SHARE ROW EXCLUSIVE MODE"))
+                referenced = "SELECT slot FROM equipment, json_array_elements_text(equipment.data -> 'slots') AS slot " \
+                             "WHERE slot IS NOT NULL"
+            case "sqlite":
+                referenced = "SELECT slot.value FROM equipment, json_each(equipment.data, '$.slots') AS slot " \
+                             "WHERE slot.type = 'text'"
+            case _:
+                raise NotImplementedError(f"Unsupported database: {dialect_name}")
+        # Checked and deleted in one statement, so equipment that was saved in the meantime is not missed
+        stmt = text(f"DELETE FROM item_records WHERE hash NOT IN ({referenced}) RETURNING hash")
+        deleted = (await session.execute(stmt)).scalars().all()
+        for item_hash in deleted:
+            item_record_cache.pop(item_hash, None)
+        return len(deleted)
 
     def __str__(self):
         nl = "\n"
@@ -118,13 +159,68 @@ class Equipment(Base):
         embed.add_field(name="Weapons", value=value, inline=False)
         return embed
 
-    def compare(self, other) -> FeedbackCollection:
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash of everything that compare checks apart from rarity and level. Equipment with the same fingerprint
+        matches perfectly, no matter how the weapons are swapped
+        """
+        def item_key(item: Item | None) -> tuple:
+            return (item.type, item.stats, tuple(sorted(item.upgrades))) if item else ()
+
+        armor = [item_key(self.get_item(slot)) for slot in EquipmentSlot.get_armor_slots()]
+        trinkets = [item_key(self.backpack), item_key(self.amulet)]
+        # Accessories and rings are compared regardless of their order and upgrades
+        for items in [[self.accessory_1, self.accessory_2], [self.ring_1, self.ring_2]]:
+            trinkets.append(sorted(item.stats if item else "" for item in items))
+        weapons = min(swap_weapons(*(item_key(self.get_item(slot)) for slot in EquipmentSlot.get_weapon_slots())))
+        data = json.dumps([armor, trinkets, weapons])
+        return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+    def compare(self, other, other_fingerprint: str = None) -> FeedbackCollection:
+        """The fingerprint of other can be passed if it is already known to skip the detailed comparison of matching gear"""
+        if other_fingerprint and other_fingerprint == self.fingerprint:
+            fbc = self.check_matching()
+            if fbc.level <= FeedbackLevel.SUCCESS:
+                return fbc
+
         fbc = FeedbackCollection()
         fbc.add(self.compare_armor(other))
         fbc.add(self.compare_trinkets(other))
         fbc.add(self.compare_weapons(other))
         return fbc
 
+    def check_matching(self) -> FeedbackCollection:
+        """Feedback of compare for equipment with the same fingerprint, only rarity and level need to be checked"""
+        fbc = FeedbackCollection()
+        fbg = FeedbackGroup("Armor")
+        for slot in EquipmentSlot.get_armor_slots():
+            if self.get_item(slot):
+                fbg = self.get_item(slot).check_basics(fbg)
+        if fbg.level <= FeedbackLevel.SUCCESS:
+            fbg.add(Feedback(f"All items are at least exotic", FeedbackLevel.SUCCESS))
+            fbg.add(Feedback(f"Stats and upgrades of all items are correct", FeedbackLevel.SUCCESS))
+        fbc.add(fbg)
+
+        fbg = FeedbackGroup("Trinkets")
+        for slot in EquipmentSlot.get_trinket_slots():
+            if self.get_item(slot):
+                fbg = self.get_item(slot).check_basics(fbg, Rarity.Ascended)
+        if fbg.level <= FeedbackLevel.SUCCESS:
+            fbg.add(Feedback(f"All items are at least ascended", FeedbackLevel.SUCCESS))
+            fbg.add(Feedback(f"Stats of all items are correct", FeedbackLevel.SUCCESS))
+        fbc.add(fbg)
+
+        fbg = FeedbackGroup("Weapons")
+        for item in self.weapons:
+            fbg = item.check_basics(fbg, Rarity.Ascended)
+        if fbg.level <= FeedbackLevel.SUCCESS:
+            fbg.add(Feedback(f"You are using the correct weapons", FeedbackLevel.SUCCESS))
+            fbg.add(Feedback(f"All items are at least ascended", FeedbackLevel.SUCCESS))
+            fbg.add(Feedback(f"Stats and upgrades of all items are correct", FeedbackLevel.SUCCESS))
+        fbc.add(fbg)
+        return fbc
+
     def compare_armor(self, other):
         fbg = FeedbackGroup("Armor")
         for slot in EquipmentSlot.get_armor_slots():
@@ -182,48 +278,39 @@ class Equipment(Base):
             fbg.add(Feedback(f"Stats of all items are correct", FeedbackLevel.SUCCESS))
         return fbg
 
+    def get_weapon_permutations(self) -> List[Dict[EquipmentSlot, "Item"]]:
+        """Weapons by slot with the main hands and off hands of both weapon sets swapped in every combination"""
+        slots = EquipmentSlot.get_weapon_slots()
+        return [dict(zip(slots, weapons)) for weapons in swap_weapons(*(self.get_item(slot) for slot in slots))]
+
     def compare_weapons(self, other):
         fbgs = []
-        self_cp = deepcopy(self)
-        for i in range(2):
-            for j in range(2):
-                fbg = FeedbackGroup("Weapons")
-                for slot in EquipmentSlot.get_weapon_slots():
-                    if not other.get_item(slot):
-                        # Check if the item set has an item where there should be none
-                        # In case the other gear has no items in that weapons set we can ignore (and allow) the item
-                        # In case the weapon set is not empty then there should not be any additional items, so we break
-                        if self_cp.get_item(slot):
-                            weapon_set = other.get_weaponset(slot)
-                            if weapon_set[0] or weapon_set[1]:
-                                break
-                        continue
-                    if not self_cp.get_item(slot):
-                        break
-                    if not self_cp.get_item(slot).type == other.get_item(slot).type:
-                        break
-                    fbg = self_cp.get_item(slot).check_basics(fbg, Rarity.Ascended)
-                    fbg = self_cp.get_item(slot).compare(other.get_item(slot), fbg)
-                else:
-                    # Add positive feedback
-                    if fbg.level <= FeedbackLevel.WARNING:
-                        fbg.add(Feedback(f"You are using the correct weapons", FeedbackLevel.SUCCESS))
-                        fbg.add(Feedback(f"All items are at least ascended", FeedbackLevel.SUCCESS))
-                    if fbg.level <= FeedbackLevel.SUCCESS:
-                        fbg.add(Feedback(f"Stats and upgrades of all items are correct", FeedbackLevel.SUCCESS))
-                    fbgs.append(fbg)
-
-                # Switch offhands
-                if j == 0:
-                    tmp = deepcopy(self_cp.weapon_a2)
-                    self_cp.weapon_a2 = deepcopy(self_cp.weapon_b2)
-                    self_cp.weapon_b2 = tmp
-
-            # Switch main hands
-            if i == 0:
-                self_cp = deepcopy(self)
-                self_cp.weapon_a1 = self.weapon_b1
-                self_cp.weapon_b1 = self.weapon_a1
+        for weapons in self.get_weapon_permutations():
+            fbg = FeedbackGroup("Weapons")
+            for slot in EquipmentSlot.get_weapon_slots():
+                if not other.get_item(slot):
+                    # Check if the item set has an item where there should be none
+                    # In case the other gear has no items in that weapons set we can ignore (and allow) the item
+                    # In case the weapon set is not empty then there should not be any additional items, so we break
+                    if weapons[slot]:
+                        weapon_set = other.get_weaponset(slot)
+                        if weapon_set[0] or weapon_set[1]:
+                            break
+                    continue
+                if not weapons[slot]:
+                    break
+                if not weapons[slot].type == other.get_item(slot).type:
+                    break
+                fbg = weapons[slot].check_basics(fbg, Rarity.Ascended)
+                fbg = weapons[slot].compare(other.get_item(slot), fbg)
+            else:
+                # Add positive feedback
+                if fbg.level <= FeedbackLevel.WARNING:
+                    fbg.add(Feedback(f"You are using the correct weapons", FeedbackLevel.SUCCESS))
+                    fbg.add(Feedback(f"All items are at least ascended", FeedbackLevel.SUCCESS))
+                if fbg.level <= FeedbackLevel.SUCCESS:
+                    fbg.add(Feedback(f"Stats and upgrades of all items are correct", FeedbackLevel.SUCCESS))
+                fbgs.append(fbg)
 
         if not fbgs:
             fbg = FeedbackGroup("Weapons")
@@ -241,3 +328,52 @@ class Equipment(Base):
             elif fbg.level == selected.level and len(fbg.feedback) < len(selected.feedback):
                 selected = fbg
         return selected
+
+
+
+def swap_weapons(a1, a2, b1, b2) -> List[tuple]:
+    """All layouts of two weapon sets with swapped main hands and off hands, in the order of the weapon slots"""
+    return [(a1, a2, b1, b2), (a1, b2, b1, a2), (b1, a2, a1, b2), (b1, b2, a1, a2)]
+
+
+@event.listens_for(Equipment, "before_insert")
+@event.listens_for(Equipment, "before_update")
+def serialize_equipment(mapper, connection, equipment: Equipment) -> None:
+    ItemRecord.store(connection, {item.content_hash: item.to_data() for item in equipment.items})
+    equipment.data = equipment.to_data()
+
+
+def migrate_equipment(conn: Connection) -> None:
+    """Moves equipment saved in the old layout (one items row per slot and an equipment_stats row) into the data column"""
+    columns = {column["name"] for column in inspect(conn).get_columns("equipment")}
+    if "data" not in columns:
+        conn.execute(text("ALTER TABLE equipment ADD COLUMN data JSON"))
+    if "helm_id" not in columns:
+        return
+
+    metadata = MetaData()
+    equipment_table = Table("equipment", metadata, autoload_with=conn)
+    items_table = Table("items", metadata, autoload_with=conn)
+    stats_table = Table("equipment_stats", metadata, autoload_with=conn)
+    rows = conn.execute(select(equipment_table).where(equipment_table.c.data.is_(None))).mappings().all()
+    if not rows:
+        return
+
+    items = {row["id"]: row for row in conn.execute(select(items_table)).mappings()}
+    stats = {row["id"]: row for row in conn.execute(select(stats_table)).mappings()}
+    records = {}
+    for row in rows:
+        data = {"slots": [], "stats": None}
+        for slot in EquipmentSlot:
+            item = items.get(row[f"{slot.value}_id"])
+            if item:
+                item_data = {key: item[key] for key in Item.DATA_KEYS}
+                item_hash = Item.hash_data(item_data)
+                records[item_hash] = item_data
+                data["slots"].append(item_hash)
+            else:
+                data["slots"].append(None)
+        if row["stats_id"] in stats:
+            data["stats"] = {key: stats[row["stats_id"]][key] for key in EquipmentStats.DATA_KEYS}
+        conn.execute(update(equipment_table).where(equipment_table.c.id == row["id"]).values(data=data))
+    ItemRecord.store(conn, records)
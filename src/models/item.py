@@ -1,24 +1,49 @@
-from typing import Optional, List
-from models.base import Base
+import hashlib
+import json
+from typing import Dict, List
+from sqlalchemy import JSON, Connection, String
 from sqlalchemy.orm import Mapped, mapped_column
+from models.base import Base, insert_ignore
 from models.enums.equipment_slot import EquipmentSlot
 from models.enums.rarity import Rarity
 from models.feedback import FeedbackGroup, Feedback, FeedbackLevel
 
 
-class Item(Base):
-    __tablename__ = "items"
+class Item:
+    # Attributes that make up the content of an item. The slot depends on where the item is equipped
+    DATA_KEYS = ["item_id", "name", "type", "level", "rarity", "stats", "upgrade_1", "upgrade_2"]
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    item_id: Mapped[int]
-    name: Mapped[str]
-    type: Mapped[str]
-    level: Mapped[int]
-    rarity: Mapped[Rarity]
-    slot: Mapped[EquipmentSlot]
-    stats: Mapped[str]
-    upgrade_1: Mapped[Optional[str]]
-    upgrade_2: Mapped[Optional[str]]
+    def __init__(self):
+        self.item_id: int | None = None
+        self.name: str | None = None
+        self.type: str | None = None
+        self.level: int | None = None
+        self.rarity: Rarity | None = None
+        self.slot: EquipmentSlot | None = None
+        self.stats: str | None = None
+        self.upgrade_1: str | None = None
+        self.upgrade_2: str | None = None
+
+    def to_data(self) -> dict:
+        data = {key: getattr(self, key) for key in Item.DATA_KEYS}
+        data["rarity"] = self.rarity.name
+        return data
+
+    @staticmethod
+    def from_data(slot: EquipmentSlot, data: dict) -> "Item":
+        item = Item()
+        item.__dict__.update(data)
+        item.rarity = Rarity[data["rarity"]]
+        item.slot = slot
+        return item
+
+    @staticmethod
+    def hash_data(data: dict) -> str:
+        return hashlib.blake2b(json.dumps(data, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    @property
+    def content_hash(self) -> str:
+        return Item.hash_data(self.to_data())
 
     @property
     def upgrades(self) -> List[str]:
@@ -89,4 +114,25 @@ class Item(Base):
         # Check level
         if self.level < min_level:
             fbg.add(Feedback(f"Your {self.type} has to be a level {min_level} item", FeedbackLevel.ERROR))
-        return fbg
\ No newline at end of file
+        return fbg
+
+
+# Item records never change, so every record that was loaded is kept for the lifetime of the process
+item_record_cache: Dict[str, dict] = {}
+
+
+class ItemRecord(Base):
+    """Content of an item, stored once by its hash and referenced by all equipment that contains the item"""
+    __tablename__ = "item_records"
+
+    hash: Mapped[str] = mapped_column(String(32), primary_key=True)
+    data: Mapped[dict] = mapped_column(JSON)
+
+    @staticmethod
+    def store(conn: Connection, records: Dict[str, dict]) -> None:
+        """Inserts the records that don't exist yet. Runs on the connection of a flush"""
+        # Always inserted, even if a record is cached: the flush may still be rolled back, and a record may have been
+        # pruned since it was cached. Existing records are skipped
+        if records:
+            conn.execute(insert_ignore(conn.dialect.name, ItemRecord),
+                         [{"hash": item_hash, "data": data} for item_hash, data in records.items()])
@@ -0,0 +1,35 @@
+from typing import Dict, Iterable
+from sqlalchemy import JSON, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+from models.base import Base
+
+
+class ApiDataMixin:
+    """
+    Raw GW2 API response stored by its id. Items and itemstats are effectively immutable, so they are mirrored locally
+    and never expire.
+    """
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    data: Mapped[dict] = mapped_column(JSON)
+
+    def __init__(self, id: int, data: dict):
+        super().__init__()
+        self.id = id
+        self.data = data
+
+    @classmethod
+    async def get_all(cls, session: AsyncSession, ids: Iterable[int]) -> Dict[int, dict]:
+        ids = list(ids)
+        if not ids:
+            return {}
+        rows = (await session.execute(select(cls).where(cls.id.in_(ids)))).scalars().all()
+        return {row.id: row.data for row in rows}
+
+
+class ItemData(ApiDataMixin, Base):
+    __tablename__ = "item_data"
+
+
+class ItemStatsData(ApiDataMixin, Base):
+    __tablename__ = "itemstats_data"
@@ -1,9 +1,8 @@
 import datetime
-from sqlalchemy import DateTime, BigInteger, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import DateTime, BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column
+from helpers.rules import rules
 from models.base import Base
-from models.boss import Boss
 from models.enums.log_status import LogStatus
 from models.enums.pools import BossLogPool
 from models.enums.role import Role
@@ -11,6 +10,11 @@ from models.enums.role import Role
 
 class Log(Base):
     __tablename__ = "logs"
+    __table_args__ = (
+        # Per-user lookups of the submit, review and progress views
+        Index("ix_logs_discord_user_id_status", "discord_user_id", "status", "tier"),
+        Index("ix_logs_status", "status"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     discord_user_id: Mapped[int] = mapped_column(BigInteger)
@@ -30,15 +34,6 @@ class Log(Base):
         super(Log, self).__init__()
         self.submitted_at = datetime.datetime.utcnow()
 
-    async def assign_pool(self, session: AsyncSession):
-        boss = (await session.execute(select(Boss).where(Boss.encounter_id == self.encounter_id).where(Boss.is_cm == self.is_cm))).scalar()
-        if boss:
-            self.assigned_pool = boss.log_pool
-        elif self.is_cm:
-            # If the log is a CM, but we don't have a CM boss, check for a non-CM boss
-            boss = (await session.execute(select(Boss).where(Boss.encounter_id == self.encounter_id))).scalar()
-            if boss:
-                self.assigned_pool = boss.log_pool
-
-        if not self.assigned_pool:
-            self.assigned_pool = BossLogPool.NOT_ALLOWED
\ No newline at end of file
+    async def assign_pool(self):
+        boss = await rules.get_boss(self.encounter_id, self.is_cm)
+        self.assigned_pool = boss.log_pool if boss and boss.log_pool else BossLogPool.NOT_ALLOWED
\ No newline at end of file
@@ -1,36 +1,33 @@
-from sqlalchemy.orm import Mapped, mapped_column
-from models.base import Base
 from models.enums.attribute import Attribute
 from models.enums.equipment_slot import EquipmentSlot
 
 
-class EquipmentStats(Base):
-    __tablename__ = "equipment_stats"
-
-    id: Mapped[int] = mapped_column(primary_key=True)
-    power: Mapped[int]
-    precision: Mapped[int]
-    toughness: Mapped[int]
-    vitality: Mapped[int]
-
-    concentration: Mapped[int]
-    condition_damage: Mapped[int]
-    expertise: Mapped[int]
-    ferocity: Mapped[int]
-    healing_power: Mapped[int]
+class EquipmentStats:
+    # Attributes that are stored in Equipment.data
+    DATA_KEYS = ["power", "precision", "toughness", "vitality",
+                 "concentration", "condition_damage", "expertise", "ferocity", "healing_power"]
 
     def __init__(self):
-        super().__init__()
-        self.power = 1000
-        self.precision = 1000
-        self.toughness = 1000
-        self.vitality = 1000
-
-        self.concentration = 0
-        self.condition_damage = 0
-        self.expertise = 0
-        self.ferocity = 0
-        self.healing_power = 0
+        self.power: int = 1000
+        self.precision: int = 1000
+        self.toughness: int = 1000
+        self.vitality: int = 1000
+
+        self.concentration: int = 0
+        self.condition_damage: int = 0
+        self.expertise: int = 0
+        self.ferocity: int = 0
+        self.healing_power: int = 0
+
+    def to_data(self) -> dict:
+        return {key: getattr(self, key) for key in EquipmentStats.DATA_KEYS}
+
+    @staticmethod
+    def from_data(data: dict) -> "EquipmentStats":
+        stats = EquipmentStats()
+        for key in EquipmentStats.DATA_KEYS:
+            setattr(stats, key, data[key])
+        return stats
 
     @property
     def boon_duration(self):
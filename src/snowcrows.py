@@ -1,3 +1,4 @@
+import asyncio
 from bs4 import BeautifulSoup
 import aiohttp
 from models.build import Build
@@ -27,30 +28,41 @@ async def get_sc_build(url: str, api: API = API("")) -> Build:
     build.name = f"{sc_soup.find_all('h1')[0].text}"
     build.profession = Profession[sc_soup.find_all("i", {"class": "fa-solid fa-shuffle mr-2"})[0].parent.text.strip().split(' ')[0].strip()]
     build.url = url
+
+    # Resolve all items of the build with bulk requests. The type of the items decides which rows belong to the gear
+    items_data = await api.get_items(int(table_data[i].div["data-armory-ids"]) for i in range(0, len(table_data), 2)
+                                     if table_data[i].div["data-armory-ids"])
+    gear_rows = [(i, div, item_data) for i, div, item_data in get_gear_rows(table_data, items_data)
+                 if item_data["type"] != "UpgradeComponent"]
+
+    # Resolve the upgrades and stats of the gear with bulk requests
+    upgrade_ids = set()
+    stats_ids = set()
+    for i, div, item_data in gear_rows:
+        item_id = item_data["id"]
+        if f"data-armory-{item_id}-upgrades" in str(div):
+            upgrade_ids.update(int(upgrade_id) for upgrade_id in div[f"data-armory-{item_id}-upgrades"].split(","))
+        details = item_data.get("details", {})
+        if "infix_upgrade" in details:
+            stats_ids.add(details["infix_upgrade"]["id"])
+        elif f"data-armory-{item_id}-stat" in str(div):
+            stats_id = int(div[f"data-armory-{item_id}-stat"])
+            stats_ids.add(stats_id)
+            if stats_id not in details.get("stat_choices", [stats_id]):
+                stats_ids.update(details["stat_choices"])
+    upgrades_data, stats_data_all = await asyncio.gather(api.get_items(upgrade_ids), api.get_items_stats(stats_ids))
+    items_data.update(upgrades_data)
+
     equipment = Equipment()
     stats = EquipmentStats()
     mh, oh, ring, accessory = 1, 1, 1, 1
-    for i in range(0, len(table_data), 2):
-        div = table_data[i].div
-
-        # Check if slot has item
-        if not div["data-armory-ids"]:
-            continue
-
+    for i, div, item_data in get_gear_rows(table_data, items_data):
         item = Item()
-        item.item_id = int(div["data-armory-ids"])
-        item_data = await api.get_item(item.item_id)
+        item.item_id = item_data["id"]
         item.name = item_data["name"]
         item.rarity = Rarity[item_data["rarity"]]
         item.level = item_data["level"]
 
-        # TODO: handle relics
-        if item_data["type"] == "Relic":
-            continue
-
-        if item_data["type"] in ["Consumable", "Gizmo"]:
-            break
-
         # Infusion stats
         if item_data["type"] == "UpgradeComponent":
             amount = int(table_data[i+1].p.span.text.replace("x", ""))
@@ -60,18 +72,18 @@ async def get_sc_build(url: str, api: API = API("")) -> Build:
         if "infix_upgrade" in item_data["details"]:
             stats_id = item_data["details"]["infix_upgrade"]["id"]
         elif f"data-armory-{item.item_id}-stat" in str(div):
-            stats_id = div[f"data-armory-{item.item_id}-stat"]
+            stats_id = int(div[f"data-armory-{item.item_id}-stat"])
         else:
             print(str(div))
             raise Exception(f"Unable to determine stats for {item.name} on {url}")
-        stats_data = await api.get_item_stats(stats_id)
+        stats_data = stats_data_all[stats_id]
         item.stats = stats_data["name"]
 
         upgrade_ids = []
         if f"data-armory-{item.item_id}-upgrades" in str(div):
             upgrade_ids = div[f"data-armory-{item.item_id}-upgrades"].split(",")
         for upgrade_id in upgrade_ids:
-            item.add_upgrade((await api.get_item(int(upgrade_id)))["name"])
+            item.add_upgrade(items_data[int(upgrade_id)]["name"])
 
         slot = table_data[i + 1].p.span.string
         if slot == "Main Hand":
@@ -104,7 +116,7 @@ async def get_sc_build(url: str, api: API = API("")) -> Build:
                 attributes = stats_data["attributes"]
             else:
                 for id in item_data["details"]["stat_choices"]:
-                    stats_data = await api.get_item_stats(id)
+                    stats_data = stats_data_all[id]
                     if stats_data["name"] == item.stats:
                         attributes = stats_data["attributes"]
                         break
@@ -118,6 +130,25 @@ async def get_sc_build(url: str, api: API = API("")) -> Build:
     return build
 
 
+def get_gear_rows(table_data, items_data: dict):
+    """Rows of the build table that contain gear or infusions, with the data of their item"""
+    for i in range(0, len(table_data), 2):
+        div = table_data[i].div
+
+        # Check if slot has item
+        if not div["data-armory-ids"]:
+            continue
+        item_data = items_data[int(div["data-armory-ids"])]
+
+        # TODO: handle relics
+        if item_data["type"] == "Relic":
+            continue
+
+        if item_data["type"] in ["Consumable", "Gizmo"]:
+            break
+        yield i, div, item_data
+
+
 async def get_sc_builds(profession: Profession):
     # Find all recommended and viable builds that are not kite builds
     links = []
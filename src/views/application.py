@@ -2,10 +2,11 @@ import os
 from discord import Interaction
 from api import API
 from database import Session
+from helpers.build_index import build_index
+from helpers.config_cache import config_cache
 from helpers.emotes import get_random_success_emote
 from models.application import Application
 from models.build import Build
-from models.config import Config
 from models.enums.application_status import ApplicationStatus
 from models.enums.config_key import ConfigKey
 from models.enums.profession import Profession
@@ -45,6 +46,10 @@ class SimpleButtonView(discord.ui.View):
         await super().on_error(interaction, error, item)
 
 
+# Value of the build select option that compares the gear to all builds of the profession
+BEST_MATCH = "best"
+
+
 class ApplicationView(discord.ui.View):
     def __init__(self, bot: commands.Bot, api: API, character: str):
         super().__init__()
@@ -52,6 +57,7 @@ class ApplicationView(discord.ui.View):
         self.api = api
         self.character = character
         self.original_message = None
+        self.profession = None
 
         self.equipment_tabs_select = SimpleDropdown(placeholder="Select your equipment template")
         self.build_select = SimpleDropdown(placeholder="Select your build")
@@ -66,9 +72,13 @@ class ApplicationView(discord.ui.View):
         self.add_item(self.equipment_tabs_select)
 
         # Build select
-        async with Session() as session:
-            builds = await Build.from_profession(session, Profession[character_data["profession"]])
-        for build in builds:
+        self.profession = Profession[character_data["profession"]]
+        builds = await build_index.get_builds(self.profession)
+        if builds:
+            self.build_select.add_option(label="Best matching build", value=BEST_MATCH,
+                                         description="Compare your equipment to all builds of your profession")
+        # Discord allows 25 options, one of them is the best match option
+        for build in builds[:24]:
             self.build_select.add_option(label=build.name, value=build.id)
         self.add_item(self.build_select)
 
@@ -81,13 +91,33 @@ class ApplicationView(discord.ui.View):
 
         # Defer to prevent timeouts
         await interaction.response.defer()
-        async with Session() as session:
-            build = await Build.find(session, id=int(self.build_select.values[0]))
-            config = await Config.to_dict(session)
+        config = await config_cache.to_dict()
         player_equipment = await self.api.get_equipment(self.character, int(self.equipment_tabs_select.values[0]))
 
+        # The gear is only fetched once, so all builds can be compared without further API requests
+        fbc = None
+        other_matches = ""
+        if self.build_select.values[0] == BEST_MATCH:
+            ranking = await build_index.rank(player_equipment, self.profession)
+            # All builds of the profession may have been archived since the view was opened
+            if not ranking:
+                embed = Embed(title="Gearcheck Feedback", colour=discord.Colour.red(),
+                              description=f"{FeedbackLevel.ERROR.emoji} There are no builds for your profession anymore. "
+                                          f"Please try again later.")
+                await self.original_message.edit(embed=embed, view=None)
+                return
+            build_id, fbc = ranking[0][0].id, ranking[0][1]
+            if len(ranking) > 1:
+                other_matches = "**Other builds:** " + ", ".join(f"{match.to_link()} {match_fbc.level.emoji}"
+                                                                for match, match_fbc in ranking[1:4]) + "\n"
+        else:
+            build_id = int(self.build_select.values[0])
+        async with Session() as session:
+            build = await Build.find(session, id=build_id)
+
         embed = Embed(title="Gearcheck Feedback",
                       description=f"**Comparing equipment tab {self.equipment_tabs_select.values[0]} to {build.to_link()}**\n"
+                                  f"{other_matches}"
                                   f"If your gear is not showing up correctly please equip the equipment template you selected\n\n"
                                   f"{FeedbackLevel.SUCCESS.emoji} **Success:** You have the correct gear\n"
                                   f"{FeedbackLevel.WARNING.emoji} **Warning:** Gear does not completely match the selected build\n"
@@ -95,7 +125,8 @@ class ApplicationView(discord.ui.View):
         # Add additional whitespace for better separation
         embed.add_field(name=" ", value="", inline=False)
 
-        fbc = player_equipment.compare(build.equipment)
+        if not fbc:
+            fbc = player_equipment.compare(build.equipment, build.fingerprint)
         fbc.to_embed(embed, False)
 
         application = Application()
@@ -104,6 +135,8 @@ class ApplicationView(discord.ui.View):
         application.discord_user_id = interaction.user.id
         application.account_name = await self.api.get_account_name()
         application.character_name = self.character
+        # The flow is finished, account data must not be reused
+        self.api.invalidate()
         application.status = ApplicationStatus.from_feedback(fbc.level)
         async with Session.begin() as session:
             session.add(application)
@@ -167,7 +200,7 @@ async def request_equipment_review(interaction: Interaction, application: Applic
         for fb in feedback.feedback:
             if fb.level > FeedbackLevel.SUCCESS:
                 embed = fb.to_embed(embed)
-        message = await bot.get_channel(int((await Config.get_value(session, ConfigKey.GEAR_REVIEW_CHANNEL_ID)))).send(embed=embed, view=ReviewView(bot, application.id))
+        message = await bot.get_channel(await config_cache.get_int(ConfigKey.GEAR_REVIEW_CHANNEL_ID)).send(embed=embed, view=ReviewView(bot, application.id))
         application.review_message_id = message.id
         application.status = ApplicationStatus.WAITING_FOR_REVIEW
         session.add(application)
@@ -1,10 +1,11 @@
+import asyncio
 from discord import Interaction
 from sqlalchemy import select
 from database import Session
+from helpers.config_cache import config_cache
 from helpers.embeds import generate_error_embed, get_progress_embed
 from helpers.logging import log_to_channel
 from models.application import Application
-from models.config import Config
 from models.enums.application_status import ApplicationStatus
 from models.enums.config_key import ConfigKey
 from models.enums.role import Role
@@ -34,7 +35,7 @@ class ApplicationOverview(discord.ui.View):
                             "If you want you can close your application by clicking the button below.",
                     view=CloseApplicationView(self.bot, application.id))
                 return
-            config = await Config.to_dict(session)
+        config = await config_cache.to_dict()
 
         # Check if user already has role
         for role in interaction.user.roles:
@@ -45,8 +46,7 @@ class ApplicationOverview(discord.ui.View):
 
     @discord.ui.button(label="Tier 2 [Log]", style=discord.ButtonStyle.primary, custom_id="persistent_view:submit_log_t2", row=1)
     async def submit_log_t2(self, interaction: discord.Interaction, button: discord.ui.Button):
-        async with Session.begin() as session:
-            t1_role_id = int((await Config.get_value(session, ConfigKey.T1_ROLE_ID)))
+        t1_role_id = await config_cache.get_int(ConfigKey.T1_ROLE_ID)
         for role in interaction.user.roles:
             if role.id == t1_role_id:
                 break
@@ -72,8 +72,7 @@ class ApplicationOverview(discord.ui.View):
         await self.submit_log_t3(interaction, Role.HEAL)
 
     async def submit_log_t3(self, interaction: discord.Interaction,role: Role):
-        async with Session.begin() as session:
-            config = await Config.to_dict(session)
+        config = await config_cache.to_dict()
 
         # Check if user has the correct tier
         for user_role in interaction.user.roles:
@@ -117,7 +116,7 @@ class CloseApplicationView(discord.ui.View):
             application.status = ApplicationStatus.CLOSED_BY_APPLICANT
 
             # Delete review message
-            rr_channel = interaction.guild.get_channel(int(await Config.get_value(session, ConfigKey.GEAR_REVIEW_CHANNEL_ID)))
+            rr_channel = interaction.guild.get_channel(await config_cache.get_int(ConfigKey.GEAR_REVIEW_CHANNEL_ID))
             await (await rr_channel.fetch_message(application.review_message_id)).delete()
             application.review_message_id = None
 
@@ -157,7 +156,11 @@ class ApplicationModal(discord.ui.Modal, title="Tier 1 Application"):
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
 
-        if str(self.character) in await api.get_characters():
+        # Key is valid: run the remaining checks concurrently
+        characters, mastery_feedback, kp_feedback = await asyncio.gather(
+            api.get_characters(), api.check_mastery(), api.check_kp(1))
+
+        if str(self.character) in characters:
             embed.add_field(name=f"{FeedbackLevel.SUCCESS.emoji} Character '{self.character}' found", value="",
                             inline=False)
         else:
@@ -166,13 +169,11 @@ class ApplicationModal(discord.ui.Modal, title="Tier 1 Application"):
             failed_registration = True
 
         # Check masteries
-        mastery_feedback = await api.check_mastery()
         embed = mastery_feedback.to_embed(embed)
         if mastery_feedback.level == FeedbackLevel.ERROR:
             failed_registration = True
 
         # Check KP
-        kp_feedback = await api.check_kp(1)
         embed = kp_feedback.to_embed(embed)
         if kp_feedback.level == FeedbackLevel.ERROR:
             failed_registration = True
@@ -5,8 +5,8 @@ from discord.ui import View, Modal
 from sqlalchemy import select, func, distinct
 
 from database import Session
+from helpers.config_cache import config_cache
 from helpers.emotes import get_random_success_emote
-from models.config import Config
 from models.enums.config_key import ConfigKey
 from models.enums.log_status import LogStatus
 from models.log import Log
@@ -64,8 +64,8 @@ class LogReviewModal(Modal, title="Log review"):
             # Send feedback message
             emote = ""
             role_assignment_text = ""
-            ta_channel = interaction.guild.get_channel(int(await Config.get_value(session, ConfigKey.TIER_ASSIGNMENT_CHANNEL_ID)))
-            rr_channel = interaction.guild.get_channel(int(await Config.get_value(session, ConfigKey.LOG_REVIEW_CHANNEL_ID)))
+            ta_channel = interaction.guild.get_channel(await config_cache.get_int(ConfigKey.TIER_ASSIGNMENT_CHANNEL_ID))
+            rr_channel = interaction.guild.get_channel(await config_cache.get_int(ConfigKey.LOG_REVIEW_CHANNEL_ID))
             member = interaction.guild.get_member(log.discord_user_id)
             if self.status == LogStatus.REVIEW_ACCEPTED:
                 roles = []
@@ -73,18 +73,18 @@ class LogReviewModal(Modal, title="Log review"):
                     .where(Log.status == LogStatus.REVIEW_ACCEPTED).where(Log.tier == log.tier)\
                     .where(Log.role == log.role)
                 if log.tier == 2 and (await session.execute(stmt)).scalar() + 1 >= 2:
-                    roles.append(interaction.guild.get_role(int((await session.get(Config, ConfigKey.T2_ROLE_ID.name)).value)))
-                    old_role = interaction.guild.get_role(int((await session.get(Config, ConfigKey.T1_ROLE_ID.name)).value))
+                    roles.append(interaction.guild.get_role(await config_cache.get_int(ConfigKey.T2_ROLE_ID)))
+                    old_role = interaction.guild.get_role(await config_cache.get_int(ConfigKey.T1_ROLE_ID))
                 elif log.tier == 3:
                     # After 3 different T3 bosses, assign T3 role and remove T2 role
                     stmt_t3 = select(func.count(distinct(Log.encounter_id))).where(Log.discord_user_id == log.discord_user_id)\
                     .where((Log.status == LogStatus.REVIEW_ACCEPTED) | (Log.id == log.id)).where(Log.tier == log.tier)
                     if(await session.execute(stmt_t3)).scalar() >= 3:
-                        roles.append(interaction.guild.get_role(int((await session.get(Config, ConfigKey.T3_ROLE_ID.name)).value)))
-                        old_role = interaction.guild.get_role(int((await session.get(Config, ConfigKey.T2_ROLE_ID.name)).value))
+                        roles.append(interaction.guild.get_role(await config_cache.get_int(ConfigKey.T3_ROLE_ID)))
+                        old_role = interaction.guild.get_role(await config_cache.get_int(ConfigKey.T2_ROLE_ID))
                     # After 3 T3 logs of the same role, assign role
                     if (await session.execute(stmt)).scalar() + 1 >= 3:
-                        roles.append(interaction.guild.get_role(int((await session.get(Config, log.role.get_config_key().name)).value)))
+                        roles.append(interaction.guild.get_role(await config_cache.get_int(log.role.get_config_key())))
 
                 if roles:
                     for role in roles:
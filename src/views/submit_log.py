@@ -1,15 +1,18 @@
-import aiohttp
+import asyncio
 import discord
 from discord import Interaction
 from discord.ext import commands
 from sqlalchemy import select, func
 from api import API
 from database import Session
+from exceptions import DpsReportException
+from helpers.config_cache import config_cache
 from helpers.custom_embed import CustomEmbed
+from helpers.dps_report import get_log_json
 from helpers.embeds import generate_error_embed, get_log_embed
 from helpers.log_checks import check_log
+from helpers.log_digest import LogDigest
 from helpers.logging import log_to_channel
-from models.config import Config
 from models.enums.config_key import ConfigKey
 from models.enums.log_status import LogStatus
 from models.enums.role import Role
@@ -64,44 +67,51 @@ class SubmitLogModal(discord.ui.Modal, title="Submit log"):
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
 
-        # Check KP
-        kp_feedback = await api.check_kp(self.tier)
-        embed = kp_feedback.to_embed(embed)
-        if kp_feedback.level == FeedbackLevel.ERROR:
-            await interaction.followup.send(embed=embed, ephemeral=True)
-            return
+        # Key is valid: run the remaining checks concurrently
+        kp_task = asyncio.create_task(api.check_kp(self.tier))
+        log_task = asyncio.create_task(get_log_json(str(self.log_url)))
+        account_task = asyncio.create_task(api.get_account_name())
+        try:
+            # Check KP
+            kp_feedback = await kp_task
+            embed = kp_feedback.to_embed(embed)
+            if kp_feedback.level == FeedbackLevel.ERROR:
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
 
-        # Get json data from dps.report
-        error = ""
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://dps.report/getJson?permalink=" + str(self.log_url)) as r:
-                if r.status == 200:
-                    try:
-                        log_json = await r.json()
-                    except Exception as e:
-                        error = f"{str(self.log_url)}\n{e}"
-                else:
-                    error = f"{str(self.log_url)}\n{r.status}: {await r.text()}"
-
-        if error:
-            embed.add_field(name=f"{FeedbackLevel.ERROR.emoji} Error while parsing log", value=error,
-                            inline=False)
-            await log_to_channel(self.bot, embed)
-            await interaction.followup.send(embed=embed, ephemeral=True)
-            return
+            # Get json data from dps.report
+            try:
+                log_json = await log_task
+            except DpsReportException as e:
+                embed.add_field(name=f"{FeedbackLevel.ERROR.emoji} Error while parsing log", value=e.error_message,
+                                inline=False)
+                await log_to_channel(self.bot, embed)
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+
+            account_name = await account_task
+        finally:
+            # Stop checks that are not needed anymore after a fatal error
+            tasks = (kp_task, log_task, account_task)
+            for task in tasks:
+                task.cancel()
+            # Retrieve the results, so exceptions of checks that finished in the meantime are not logged as unhandled
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        digest = LogDigest(log_json)
 
         # Create log
         log = Log()
         log.discord_user_id = interaction.user.id
         log.tier = self.tier
         log.role = self.role
-        log.encounter_id = log_json["eiEncounterID"]
-        log.fight_name = log_json["fightName"]
-        log.is_cm = log_json["isCM"]
+        log.encounter_id = digest.encounter_id
+        log.fight_name = digest.fight_name
+        log.is_cm = digest.is_cm
         log.log_url = str(self.log_url)
 
         # Check log
-        fbc = await check_log(log_json, await api.get_account_name(), self.tier, interaction.user.id, str(self.log_url), log)
+        fbc = await check_log(digest, account_name, self.tier, interaction.user.id, str(self.log_url), log)
         fbc.to_embed(embed)
         if fbc.level == FeedbackLevel.SUCCESS:
             embed.add_field(name="Log successfully submitted for manual review", value="", inline=False)
@@ -119,17 +129,15 @@ class SubmitLogModal(discord.ui.Modal, title="Submit log"):
                 return
 
             # Create review message
-            review_embed = get_log_embed(str(self.log_url), log_json, interaction.user, await api.get_account_name(), self.role, self.tier)
+            review_embed = get_log_embed(str(self.log_url), digest, interaction.user, account_name, self.role, self.tier)
             fbc.to_embed(review_embed)
 
-            message = await self.bot.get_channel(int(await Config.get_value(session, ConfigKey.LOG_REVIEW_CHANNEL_ID)))\
+            message = await self.bot.get_channel(await config_cache.get_int(ConfigKey.LOG_REVIEW_CHANNEL_ID))\
                 .send(embed=review_embed, view=LogReviewView(self.bot, log.id))
             log.review_message_id = message.id
             session.add(log)
         await interaction.followup.send(embed=embed, ephemeral=True)
 
-
-
     async def on_error(self, interaction: Interaction, error: Exception) -> None:
         await interaction.followup.send(embed=generate_error_embed(error), ephemeral=True)
         # Log error